@@ -0,0 +1,49 @@
+import pytest
+
+from ydl_extreme.urls import canonical_url, video_key
+
+# (url, expected id) pairs; None means no ID.  IDs from other sites need
+# yt-dlp installed
+URL_CORPUS = [
+    ('https://www.youtube.com/watch?v=dQw4w9WgXcQ', 'youtube:dQw4w9WgXcQ'),
+    ('https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PL590L5WQmH8fJ54F369BLDSqIwcs-TCfs&index=3',
+     'youtube:dQw4w9WgXcQ'),
+    ('https://www.youtube.com/watch?v=dQw4w9WgXcQ&feature=youtu.be&t=42s', 'youtube:dQw4w9WgXcQ'),
+    ('https://www.youtube.com/watch?feature=share&v=dQw4w9WgXcQ', 'youtube:dQw4w9WgXcQ'),
+    ('https://www.youtube.com/watch?v=dQw4w9WgXcQ&pp=ygUJcmljayByb2xs', 'youtube:dQw4w9WgXcQ'),
+    ('https://youtube.com/watch?v=dQw4w9WgXcQ#t=30', 'youtube:dQw4w9WgXcQ'),
+    ('http://m.youtube.com/watch?v=dQw4w9WgXcQ&si=abcdefgh', 'youtube:dQw4w9WgXcQ'),
+    ('https://music.youtube.com/watch?v=dQw4w9WgXcQ&si=abcdefgh', 'youtube:dQw4w9WgXcQ'),
+    ('https://youtu.be/dQw4w9WgXcQ', 'youtube:dQw4w9WgXcQ'),
+    ('https://youtu.be/dQw4w9WgXcQ?si=x1y2z3&t=10', 'youtube:dQw4w9WgXcQ'),
+    ('https://www.youtube.com/shorts/dQw4w9WgXcQ?feature=share', 'youtube:dQw4w9WgXcQ'),
+    ('https://www.youtube.com/embed/dQw4w9WgXcQ?start=10', 'youtube:dQw4w9WgXcQ'),
+    ('https://www.youtube-nocookie.com/embed/dQw4w9WgXcQ', 'youtube:dQw4w9WgXcQ'),
+    ('https://www.youtube.com/v/dQw4w9WgXcQ', 'youtube:dQw4w9WgXcQ'),
+    ('https://www.youtube.com/live/dQw4w9WgXcQ?si=abc', 'youtube:dQw4w9WgXcQ'),
+    ('www.youtube.com/watch?v=dQw4w9WgXcQ', 'youtube:dQw4w9WgXcQ'),
+    ('  https://www.youtube.com/watch?v=dQw4w9WgXcQ  ', 'youtube:dQw4w9WgXcQ'),
+    ('https://www.youtube.com/watch?v=tooshort', None),
+    ('https://www.youtube.com/', None),
+    ('https://www.youtube.com/playlist?list=PL590L5WQmH8fJ54F369BLDSqIwcs-TCfs', None),
+    ('https://www.youtube.com/@channel', None),
+    ('https://www.youtube.com/channel/UCuAXFkgsw1L7xaCfnd5JJOw', None),
+    ('https://example.com/watch?v=dQw4w9WgXcQ', None),
+    ('https://vimeo.com/76979871', 'vimeo:76979871'),
+    ('https://www.dailymotion.com/video/x7tgad0', 'dailymotion:x7tgad0'),
+]
+
+
+@pytest.mark.parametrize('url, expected', URL_CORPUS)
+def test_video_key(url, expected):
+    if expected and not expected.startswith('youtube:'):
+        pytest.importorskip('yt_dlp')
+    assert video_key(url) == expected
+
+@pytest.mark.parametrize('url, expected', [url_id for url_id in URL_CORPUS
+                                           if url_id[1] and url_id[1].startswith('youtube:')])
+def test_canonical_url(url, expected):
+    assert canonical_url(url) == 'https://www.youtube.com/watch?v=' + expected.split(':', 1)[1]
+
+def test_other_urls_kept():
+    assert canonical_url(' https://example.com/clip.mp4 ') == 'https://example.com/clip.mp4'
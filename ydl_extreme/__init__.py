@@ -0,0 +1,24 @@
+'''Library API behind the youtube_dl_extreme command-line scripts.
+
+A job goes through four plain functions, each taking a Job built from a
+Config:
+
+    config = Config(res=1080)
+    job = Job('https://www.youtube.com/watch?v=...', config, audio=True)
+    download(job)
+    probe(job)
+    finalize(job, encode(job))
+
+Importing the package has no side effects: nothing reads sys.argv, touches
+the filesystem or attaches log handlers until a function is called, and
+youtube-dl/yt-dlp are only imported when something is downloaded.
+'''
+
+from .config import Config, parse_args
+from .job import Job
+from .download import download
+from .probe import probe
+from .encode import encode
+from .files import finalize
+
+__all__ = ['Config', 'Job', 'parse_args', 'download', 'probe', 'encode', 'finalize']
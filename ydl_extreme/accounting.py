@@ -0,0 +1,147 @@
+'''Resource accounting for external processes, attributed to job and stage.
+
+process.py reaps every child with os.wait4 (where the OS has it) and hands
+its rusage here: user/sys CPU, peak RSS, block I/O, wall time and exit
+status.  For the && chains run under a shell the figures include every
+command in the chain.  Usage is attributed to whatever stage() is active
+in the calling context, and appended to that job's usage list;
+summarize() logs the per-stage totals when a job finishes.  staged()
+functions also widen the job's stages[name] to the [start, end] wall-clock
+span of every call, so parallel calls aren't counted twice.
+
+Thread pools don't inherit the context, so work submitted to one is
+wrapped with propagate().
+
+yt-dlp starts its own ffmpeg children (format merging, download_ranges
+cuts) and reaps them itself.  children() records those as one entry per
+block: the growth of RUSAGE_CHILDREN over the block, less what process.py
+reaped meanwhile.  It's approximate while other jobs run at the same time
+(watch mode), and not available where the resource module isn't (Windows).
+'''
+
+import contextvars
+import functools
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from .logs import log_file_only
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+_current = contextvars.ContextVar('ydl_extreme_stage', default=(None, None))
+_spans_lock = threading.Lock()
+# Usage of every child process.py reaped, to tell them apart in children()
+USAGE_FIELDS = ('ru_utime', 'ru_stime', 'ru_inblock', 'ru_oublock')
+_reaped = dict.fromkeys(USAGE_FIELDS, 0)
+_reaped_lock = threading.Lock()
+
+
+@contextmanager
+def stage(name, job=None):
+    '''Attribute processes started in this block to job and stage name.'''
+    token = _current.set((job if job is not None else _current.get()[0], name))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+def staged(name):
+    '''Decorator: run a function taking a job as its first argument as stage name.'''
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(job, *args, **kwargs):
+            started = time.time()
+            try:
+                with stage(name, job):
+                    return fn(job, *args, **kwargs)
+            finally:
+                with _spans_lock:
+                    span = job.stages.setdefault(name, [started, started])
+                    span[0], span[1] = min(span[0], started), max(span[1], time.time())
+        return wrapper
+    return decorate
+
+def propagate(fn):
+    '''Wrap fn so it runs in (a copy of) the current job/stage when called from a pool.'''
+    context = contextvars.copy_context()
+    def run(*args, **kwargs):
+        return context.copy().run(fn, *args, **kwargs)
+    return run
+
+def usage_entry(proc, returncode, usage, wall):
+    command = proc.split()[0] if isinstance(proc, str) else proc[0]
+    entry = {'command': command, 'exit': returncode, 'wall': round(wall, 3)}
+    if usage is not None:
+        # ru_maxrss is kilobytes on Linux but bytes on macOS
+        maxrss = usage.ru_maxrss // 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+        entry.update({'user': round(usage.ru_utime, 3), 'sys': round(usage.ru_stime, 3),
+                      'maxrss_kb': maxrss, 'inblock': usage.ru_inblock, 'oublock': usage.ru_oublock})
+    return entry
+
+def record(proc, returncode, usage, wall):
+    '''Log one finished process and add it to the current job's usage.'''
+    if usage is not None:
+        with _reaped_lock:
+            for field in USAGE_FIELDS:
+                _reaped[field] += getattr(usage, field)
+    add_entry(usage_entry(proc, returncode, usage, wall))
+
+def add_entry(entry):
+    job, name = _current.get()
+    entry['stage'] = name
+    log_file_only.info('usage: {} {}'.format(job.source if job is not None else '-', entry))
+    if job is not None:
+        job.usage.append(entry)
+
+def children_usage():
+    '''RUSAGE_CHILDREN less what process.py reaped, and the children's peak RSS.'''
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    with _reaped_lock:
+        result = {field: getattr(usage, field) - _reaped[field] for field in USAGE_FIELDS}
+    result['ru_maxrss'] = usage.ru_maxrss
+    return result
+
+@contextmanager
+def children(command):
+    '''Record children reaped by someone else during the block (see the module docstring).'''
+    if resource is None:
+        yield
+        return
+    before = children_usage()
+    try:
+        yield
+    finally:
+        after = children_usage()
+        delta = {field: after[field] - before[field] for field in USAGE_FIELDS}
+        if delta['ru_utime'] + delta['ru_stime'] > 0:
+            # No wall time: the block is mostly the download itself.  Peak RSS
+            # is only known if one of these children set a new high
+            maxrss = after['ru_maxrss'] if after['ru_maxrss'] > before['ru_maxrss'] else 0
+            add_entry({'command': command, 'exit': 0,
+                       'user': round(delta['ru_utime'], 3), 'sys': round(delta['ru_stime'], 3),
+                       'maxrss_kb': maxrss // 1024 if sys.platform == 'darwin' else maxrss,
+                       'inblock': delta['ru_inblock'], 'oublock': delta['ru_oublock']})
+
+def totals(entries):
+    '''Sum entries per stage: count, wall, user, sys, peak RSS and block I/O.'''
+    result = {}
+    for entry in entries:
+        total = result.setdefault(entry.get('stage'), {'count': 0, 'wall': 0.0, 'user': 0.0, 'sys': 0.0,
+                                                       'maxrss_kb': 0, 'inblock': 0, 'oublock': 0})
+        total['count'] += 1
+        for key in ('wall', 'user', 'sys', 'inblock', 'oublock'):
+            total[key] += entry.get(key, 0)
+        total['maxrss_kb'] = max(total['maxrss_kb'], entry.get('maxrss_kb', 0))
+    return result
+
+def summarize(job, logger=log_file_only):
+    '''Log the job's per-stage totals.'''
+    for name, total in sorted(totals(job.usage).items(), key=lambda item: str(item[0])):
+        logger.info('{:<10} {:3d} processes, {:8.1f}s wall, {:8.1f}s CPU, {:6.0f} MB peak'.format(
+            name or 'other', total['count'], total['wall'], total['user'] + total['sys'],
+            total['maxrss_kb'] / 1024.0))
@@ -0,0 +1,166 @@
+'''Sampled media analysis: dead audio channels, black bars and loudness.
+
+Instead of decoding the whole file, a few short evenly spaced windows are
+decoded in parallel with astats, ebur128 and cropdetect.  The result drives
+channel mapping, crop-before-scale and whether normalization is needed in
+the main encode.
+'''
+
+import math
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from .accounting import propagate, staged
+from .logs import log
+from .probe import get_duration, get_resolution
+from .process import output
+from .templates import FFMPEG_ANALYZE
+from .timecode import format_time, parse_time
+
+ANALYSIS_WINDOWS = 5
+ANALYSIS_WINDOW_LENGTH = 3
+# A channel whose RMS level stays below this in every window is considered dead
+DEAD_CHANNEL_DB = -70
+# Bars thinner than this fraction of the frame aren't worth cropping
+MIN_CROP_FRACTION = 0.02
+# ffmpeg-normalize's default EBU R128 target, and how close counts as already there
+LOUDNESS_TARGET = -23.0
+LOUDNESS_TOLERANCE = 1.0
+
+CHANNEL_RE = re.compile(r'\] Channel: (\d+)')
+RMS_RE = re.compile(r'\] RMS level dB: (-?inf|-?[\d.]+)')
+OVERALL_RE = re.compile(r'\] Overall')
+INTEGRATED_RE = re.compile(r'\bI:\s+(-?inf|-?[\d.]+) LUFS')
+CROP_RE = re.compile(r'crop=(\d+):(\d+):(\d+):(\d+)')
+
+
+def get_windows(start, end, count=ANALYSIS_WINDOWS, length=ANALYSIS_WINDOW_LENGTH):
+    '''Return up to count (start, length) windows spread evenly over [start, end].'''
+    span = end - start
+    if span <= count * length:
+        return [(start, span)]
+    step = span / count
+    return [(start + step * i + (step - length) / 2, length) for i in range(count)]
+
+def parse_window(text):
+    '''Pull per-channel RMS, integrated loudness and the crop out of ffmpeg output.'''
+    rms = {}
+    loudness = crop = None
+    channel = None
+    for line in text.splitlines():
+        m = CHANNEL_RE.search(line)
+        if m:
+            channel = int(m.group(1))
+            continue
+        if OVERALL_RE.search(line):
+            channel = None
+            continue
+        m = RMS_RE.search(line)
+        if m and channel is not None:
+            rms[channel] = float(m.group(1))
+            continue
+        m = INTEGRATED_RE.search(line)
+        if m:
+            loudness = float(m.group(1))
+        m = CROP_RE.search(line)
+        if m:
+            crop = tuple(int(v) for v in m.groups())
+    return {'rms': rms, 'loudness': loudness, 'crop': crop}
+
+def analyze_window(video_path, start, length, has_audio, has_video):
+    proc = []
+    for arg in FFMPEG_ANALYZE:
+        if arg == '{audio_filter}':
+            proc.extend(['-af', 'astats,ebur128'] if has_audio else ['-an'])
+        elif arg == '{video_filter}':
+            proc.extend(['-vf', 'cropdetect=round=2'] if has_video else ['-vn'])
+        else:
+            proc.append(arg.format(inpath=video_path, startpoint=format_time(start),
+                                   length=format_time(length)))
+    return parse_window(output(proc))
+
+def combine(windows, resolution):
+    '''Merge per-window results into one analysis dict.'''
+    result = {'live_channel': None, 'dead_channels': [], 'loudness': None, 'crop': None}
+
+    levels = {}
+    for window in windows:
+        for channel, level in window['rms'].items():
+            levels[channel] = max(levels.get(channel, -math.inf), level)
+    dead = sorted(channel for channel, level in levels.items() if level < DEAD_CHANNEL_DB)
+    live = [channel for channel in sorted(levels) if channel not in dead]
+    # Only one-sided stereo is remapped; a quiet channel in a multichannel
+    # layout (e.g. an empty LFE) is left to the normal downmix
+    if len(levels) == 2 and len(dead) == 1:
+        result['dead_channels'] = dead
+        result['live_channel'] = max(live, key=lambda channel: levels[channel])
+
+    # Average the windows' loudness as energy, not as dB
+    loudness = [w['loudness'] for w in windows if w['loudness'] is not None and w['loudness'] > -70]
+    if loudness:
+        result['loudness'] = 10 * math.log10(sum(10 ** (l / 10) for l in loudness) / len(loudness))
+
+    # Union of every window's picture area, so a dark scene can't crop real picture
+    crops = [w['crop'] for w in windows if w['crop']]
+    if crops and resolution:
+        left = min(c[2] for c in crops)
+        top = min(c[3] for c in crops)
+        right = max(c[2] + c[0] for c in crops)
+        bottom = max(c[3] + c[1] for c in crops)
+        width, height = resolution
+        if (width - (right - left) > width * MIN_CROP_FRACTION or
+                height - (bottom - top) > height * MIN_CROP_FRACTION):
+            result['crop'] = (right - left, bottom - top, left, top)
+    return result
+
+@staged('analyze')
+def analyze(job):
+    '''Analyze sampled windows of the job's (trimmed) video and store the result on the job.'''
+    metadata = job.metadata
+    streams = metadata.get('streams') or []
+    has_audio = any(s.get('codec_type') == 'audio' for s in streams)
+    has_video = any(s.get('codec_type') == 'video' for s in streams) and not job.audio
+    duration = get_duration(metadata)
+    start = parse_time(job.inpoint) or 0
+    end = parse_time(job.outpoint)
+    if end is None:
+        end = duration or start + ANALYSIS_WINDOW_LENGTH
+    if duration:
+        end = min(end, duration)
+
+    windows = get_windows(start, end)
+    with ThreadPoolExecutor(max_workers=len(windows)) as pool:
+        results = list(pool.map(propagate(lambda w: analyze_window(job.files['video'], w[0], w[1],
+                                                                   has_audio, has_video)),
+                                windows))
+    job.analysis = combine(results, get_resolution(metadata))
+    log.info('Analysis of {} sampled windows: {}'.format(len(windows), job.analysis))
+    return job.analysis
+
+def channel_filter(analysis, monofix=False):
+    '''Return the pan filter mapping a dead channel, or '' if none is needed.'''
+    live = analysis.get('live_channel')
+    if live is not None:
+        log.info('Audio only in channel {}, copying it to both channels'.format(live))
+        return 'pan=stereo|c0=c{live}|c1=c{live}'.format(live=live - 1)
+    if monofix:
+        return 'pan=stereo|c0=c0+c1|c1=c0+c1'
+    return ''
+
+def crop_filter(analysis):
+    '''Return the crop= prefix for the letterbox filter chain, or ''.'''
+    crop = analysis.get('crop')
+    if not crop:
+        return ''
+    log.info('Cropping baked-in black bars: {}x{}+{}+{}'.format(*crop))
+    return 'crop={}:{}:{}:{},'.format(*crop)
+
+def needs_normalizing(analysis):
+    '''False when the sampled loudness is already within tolerance of the target.'''
+    loudness = analysis.get('loudness')
+    if loudness is None:
+        return True
+    if abs(loudness - LOUDNESS_TARGET) <= LOUDNESS_TOLERANCE:
+        log.info('Loudness {:.1f} LUFS already near {} LUFS, skipping normalization'.format(loudness, LOUDNESS_TARGET))
+        return False
+    return True
@@ -0,0 +1,162 @@
+'''Process-wide download bandwidth limiting, shared fairly between jobs.
+
+The downloader calls a progress hook after every chunk; sleeping in that
+hook is what slows the download down.  Each job's hook draws the bytes it
+just received from a global token bucket (the -bandwidth cap, or whatever
+the -bandwidth-schedule says for the time of day) and from its own bucket.
+That one is refilled at an equal share of the global rate across the
+downloads active right now, and never faster than -job-bandwidth.
+
+Downloaders that only report progress when they finish can't be slowed
+from the hook, so yt-dlp's own ratelimit option is set as well, to the
+job's cap when its download starts (see fixed_rate()).  That covers the
+native and external HTTP downloaders, but not ffmpeg, which has no byte
+rate option: trimmed downloads (download_ranges) always go through ffmpeg
+and are not limited at all.
+
+Rates are bytes per second with an optional K/M/G suffix, like yt-dlp's
+--limit-rate; 0 means unlimited.  A schedule is a comma-separated list of
+HH:MM-HH:MM=RATE ranges in local time, e.g. 09:00-18:00=2M,18:00-09:00=0.
+Times outside every range use -bandwidth.
+'''
+
+import re
+import threading
+import time
+
+# A job counts as active if its hook ran this recently
+ACTIVE_SECONDS = 2.0
+# Buckets hold at most this many seconds' worth of bytes
+BURST_SECONDS = 0.5
+
+RATE_RE = re.compile(r'^\s*([\d.]+)\s*([kmg]?)i?b?\s*$', re.IGNORECASE)
+RANGE_RE = re.compile(r'^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*=\s*(.+)$')
+MULTIPLIERS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def parse_rate(value):
+    '''Bytes per second for '500K', '2M' and the like; None for 0/blank (unlimited).'''
+    if value is None or not str(value).strip():
+        return None
+    match = RATE_RE.match(str(value))
+    if not match:
+        raise ValueError('Invalid bandwidth: {}'.format(value))
+    rate = float(match.group(1)) * MULTIPLIERS[match.group(2).lower()]
+    return rate or None
+
+def parse_schedule(value):
+    '''[(start_minute, end_minute, rate)] from 'HH:MM-HH:MM=RATE,...'.'''
+    schedule = []
+    for part in (value or '').split(','):
+        if not part.strip():
+            continue
+        match = RANGE_RE.match(part)
+        if not match:
+            raise ValueError('Invalid bandwidth schedule entry: {}'.format(part))
+        h1, m1, h2, m2 = (int(x) for x in match.groups()[:4])
+        schedule.append((h1 * 60 + m1, h2 * 60 + m2, parse_rate(match.group(5))))
+    return schedule
+
+def scheduled_rate(schedule, default, now=None):
+    '''The rate for the current local time; ranges may wrap past midnight.'''
+    local = time.localtime(now)
+    minute = local.tm_hour * 60 + local.tm_min
+    for start, end, rate in schedule:
+        if start <= end and start <= minute < end:
+            return rate
+        if start > end and (minute >= start or minute < end):
+            return rate
+    return default
+
+
+class TokenBucket(object):
+    '''Token bucket whose rate can change; consume() says how long to sleep.'''
+
+    def __init__(self):
+        self.tokens = 0.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def consume(self, amount, rate):
+        with self.lock:
+            now = time.monotonic()
+            if rate is None:
+                self.tokens, self.updated = 0.0, now
+                return 0
+            self.tokens = min(self.tokens + (now - self.updated) * rate, rate * BURST_SECONDS)
+            self.updated = now
+            self.tokens -= amount
+            return -self.tokens / rate if self.tokens < 0 else 0
+
+
+class BandwidthLimiter(object):
+    '''The global bucket plus one bucket per job; see the module docstring.'''
+
+    def __init__(self, limit=None, job_limit=None, schedule=None):
+        self.limit = limit
+        self.job_limit = job_limit
+        self.schedule = schedule or []
+        self.bucket = TokenBucket()
+        self.active = {}
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.limit or self.job_limit or any(rate for _, _, rate in self.schedule))
+
+    def rate(self):
+        return scheduled_rate(self.schedule, self.limit)
+
+    def fixed_rate(self):
+        '''The lower of the global rate right now and job_limit, for yt-dlp's ratelimit.'''
+        rates = [r for r in (self.rate(), self.job_limit) if r]
+        return min(rates) if rates else None
+
+    def share(self, key):
+        '''This job's rate: an equal part of the global rate, capped at job_limit.'''
+        now = time.monotonic()
+        with self.lock:
+            self.active[key] = now
+            for other, seen in list(self.active.items()):
+                if now - seen > ACTIVE_SECONDS:
+                    del self.active[other]
+            count = len(self.active)
+        total = self.rate()
+        rates = [r for r in (total / count if total else None, self.job_limit) if r]
+        return min(rates) if rates else None
+
+    def hook(self):
+        '''Return a progress hook that throttles one job's downloads.'''
+        bucket = TokenBucket()
+        seen = {}
+        key = object()
+
+        def throttle(status):
+            if status.get('status') != 'downloading':
+                return
+            name = status.get('filename')
+            downloaded = status.get('downloaded_bytes') or 0
+            amount = downloaded - seen.get(name, 0)
+            if amount < 0:
+                amount = downloaded
+            seen[name] = downloaded
+            if amount <= 0:
+                return
+            wait = max(bucket.consume(amount, self.share(key)),
+                       self.bucket.consume(amount, self.rate()))
+            if wait:
+                time.sleep(wait)
+        return throttle
+
+def get_limiter(config):
+    '''The process-wide limiter for config's bandwidth settings, or None if unlimited.'''
+    settings = (config.bandwidth, config.job_bandwidth, config.bandwidth_schedule)
+    with _limiters_lock:
+        if settings not in _limiters:
+            _limiters[settings] = BandwidthLimiter(config.bandwidth_rate, config.job_bandwidth_rate,
+                                                   config.schedule)
+        limiter = _limiters[settings]
+    return limiter if limiter.enabled else None
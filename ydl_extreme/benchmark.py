@@ -0,0 +1,311 @@
+'''Offline download benchmark against a local stand-in for the video site.
+
+    python -m ydl_extreme.benchmark --latency 0.05 --rate 4M --error-rate 0.02
+
+A ThreadingHTTPServer on 127.0.0.1 serves synthetic media made with ffmpeg
+(a progressive mp4, and the same streams as HLS and as DASH) with injected
+faults: latency before every response, a per-connection rate cap, and a
+share of requests that fail, either with a 503 or by dropping the
+connection halfway through the body.  Range requests are honoured so
+resumed downloads behave as they do against a CDN.
+
+Each case runs download() on a Job for the local URL, so yt-dlp's generic
+extractor and the same downloader options as a real job (socket timeout,
+stall retries, bandwidth limits) are exercised.  Reported per case, as the
+median over --runs: wall time, throughput, time from the start of the
+download to its first received byte, requests made, faults injected and
+requests that retried a path after a fault.
+'''
+
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .bandwidth import TokenBucket, parse_rate
+from .config import Config
+from .download import download
+from .job import Job
+from .logs import log, log_file_only
+from .process import run
+from .templates import FFMPEG_BENCH_DASH, FFMPEG_BENCH_HLS, FFMPEG_BENCH_SOURCE
+
+MEDIA_DIR = os.path.join(tempfile.gettempdir(), 'ydl_benchmark_media')
+CHUNK_SIZE = 64 * 1024
+# URL path of each case, relative to the media folder
+CASES = {'progressive': 'progressive.mp4', 'hls': 'hls/master.m3u8', 'dash': 'dash/manifest.mpd'}
+# yt-dlp skips fragments it can't get without failing the download, so a
+# stream case only counts as ok if its output holds at least this share of
+# the served segment bytes (remuxing TS into MP4 sheds a few percent)
+COMPLETE_SHARE = 0.9
+CONTENT_TYPES = {'.mp4': 'video/mp4', '.m3u8': 'application/vnd.apple.mpegurl', '.ts': 'video/mp2t',
+                 '.mpd': 'application/dash+xml', '.m4s': 'video/iso.segment'}
+
+
+class Faults(object):
+    '''What the server does wrong: latency, per-connection rate and error rate.'''
+
+    def __init__(self, latency=0.0, rate=None, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.rate = rate
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def pick(self):
+        '''None for a good response, otherwise '503' or 'drop'.'''
+        with self.lock:
+            if self.random.random() >= self.error_rate:
+                return None
+            return self.random.choice(['503', 'drop'])
+
+
+class MediaHandler(BaseHTTPRequestHandler):
+    '''Serve files under server.root with Range support and server.faults.'''
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        log_file_only.info('benchmark server: {}'.format(format % args))
+
+    def do_HEAD(self):
+        self.respond(body=False)
+
+    def do_GET(self):
+        self.respond(body=True)
+
+    def respond(self, body):
+        server = self.server
+        path = os.path.normpath(os.path.join(server.root, self.path.split('?')[0].lstrip('/')))
+        entry = server.start_request(self.path)
+        time.sleep(server.faults.latency)
+        if not path.startswith(server.root + os.sep) or not os.path.isfile(path):
+            return self.send_status(404, entry)
+        fault = server.faults.pick()
+        entry['fault'] = fault
+        if fault == '503':
+            return self.send_status(503, entry)
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        requested = self.headers.get('Range', '')
+        if requested.startswith('bytes='):
+            first, _, last = requested[6:].split(',')[0].partition('-')
+            start = int(first) if first else max(size - int(last), 0)
+            end = int(last) if first and last else size - 1
+            if start >= size:
+                return self.send_status(416, entry)
+            end = min(end, size - 1)
+        self.send_response(206 if requested else 200)
+        self.send_header('Content-Type', CONTENT_TYPES.get(os.path.splitext(path)[1], 'application/octet-stream'))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end - start + 1))
+        if requested:
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, end, size))
+        self.end_headers()
+        entry['status'] = 206 if requested else 200
+        if not body:
+            return
+        # A dropped connection sends half the body, then hangs up
+        remaining = end - start + 1 if fault != 'drop' else (end - start + 1) // 2
+        bucket = TokenBucket()
+        try:
+            with open(path, 'rb') as f:
+                f.seek(start)
+                while remaining > 0:
+                    chunk = f.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    wait = bucket.consume(len(chunk), server.faults.rate)
+                    if wait:
+                        time.sleep(wait)
+                    self.wfile.write(chunk)
+                    entry['bytes'] += len(chunk)
+                    remaining -= len(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            entry['aborted'] = True
+        if fault == 'drop':
+            self.close_connection = True
+
+    def send_status(self, status, entry):
+        entry['status'] = status
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class MediaServer(ThreadingHTTPServer):
+    '''The media folder over HTTP, keeping a record of every request.'''
+
+    def __init__(self, root, faults, host='127.0.0.1', port=0):
+        ThreadingHTTPServer.__init__(self, (host, port), MediaHandler)
+        self.root = os.path.realpath(root)
+        self.faults = faults
+        self.lock = threading.Lock()
+        self.requests = []
+
+    @property
+    def url(self):
+        return 'http://{}:{}/'.format(*self.server_address[:2])
+
+    def start_request(self, path):
+        entry = {'path': path, 'time': time.monotonic(), 'status': None, 'fault': None,
+                 'bytes': 0, 'aborted': False}
+        with self.lock:
+            self.requests.append(entry)
+        return entry
+
+    def reset(self):
+        with self.lock:
+            self.requests = []
+
+    def stats(self):
+        '''Requests, faults injected, retries after a fault and bytes sent so far.'''
+        with self.lock:
+            requests = list(self.requests)
+        failed, retries = set(), 0
+        for entry in requests:
+            if entry['path'] in failed:
+                retries += 1
+            if entry['fault']:
+                failed.add(entry['path'])
+        return {'requests': len(requests), 'faults': sum(1 for e in requests if e['fault']),
+                'retries': retries, 'bytes_sent': sum(e['bytes'] for e in requests)}
+
+
+def make_media(folder, config, seconds):
+    '''Create the synthetic source and its HLS and DASH versions, unless already there.'''
+    source = os.path.join(folder, CASES['progressive'])
+    if all(os.path.exists(os.path.join(folder, path)) for path in CASES.values()):
+        return True
+    for sub in ['hls', 'dash']:
+        os.makedirs(os.path.join(folder, sub), exist_ok=True)
+    log.info('Creating {}s of {}x{} synthetic media in {}'.format(seconds, config.width, config.height, folder))
+    for template, outdir in [(FFMPEG_BENCH_SOURCE, None), (FFMPEG_BENCH_HLS, 'hls'), (FFMPEG_BENCH_DASH, 'dash')]:
+        proc = [arg.format(width=config.width, height=config.height, length=seconds, inpath=source,
+                           outpath=source, outdir=os.path.join(folder, outdir or '')) for arg in template]
+        if not run(proc):
+            log.warning('Could not create the benchmark media')
+            return False
+    return True
+
+def served_size(folder, name):
+    '''Bytes of media behind a case: the mp4 itself, or all of its segments.'''
+    path = os.path.join(folder, CASES[name])
+    if name == 'progressive':
+        return os.path.getsize(path)
+    segments = os.path.dirname(path)
+    return sum(os.path.getsize(os.path.join(segments, f)) for f in os.listdir(segments)
+               if os.path.splitext(f)[1] not in ('.m3u8', '.mpd'))
+
+def run_case(server, name, config):
+    '''Download one case through download() and return its measurements.'''
+    job = Job(server.url + CASES[name], config)
+    first_byte = []
+
+    def hook(status):
+        if not first_byte and status.get('downloaded_bytes'):
+            first_byte.append(time.monotonic())
+    job.progress_hooks.append(hook)
+    server.reset()
+    started = time.monotonic()
+    failed = False
+    try:
+        download(job)
+    except Exception as e:
+        failed = True
+        log.warning('{} failed: {}'.format(name, e))
+    elapsed = time.monotonic() - started
+    video = job.files.get('video')
+    size = os.path.getsize(video) if video and os.path.exists(video) else 0
+    expected = served_size(server.root, name)
+    complete = size == expected if name == 'progressive' else size >= expected * COMPLETE_SHARE
+    ok = not failed and job.info is not None and complete
+    if not ok:
+        log.warning('{}: got {} of {} bytes'.format(name, size, expected))
+    result = dict(server.stats(), case=name, ok=ok, seconds=elapsed, bytes=size,
+                  throughput=size / elapsed if elapsed else 0,
+                  first_byte=first_byte[0] - started if first_byte else None)
+    shutil.rmtree(job.downloading, ignore_errors=True)
+    return result
+
+def median(results, key):
+    values = [r[key] for r in results if r[key] is not None]
+    return statistics.median(values) if values else None
+
+def summarize(results):
+    '''The median of each measurement over the runs of one case.'''
+    keys = ['seconds', 'bytes', 'throughput', 'first_byte', 'requests', 'faults', 'retries']
+    summary = {key: median(results, key) for key in keys}
+    summary.update(case=results[0]['case'], ok=sum(r['ok'] for r in results), runs=len(results))
+    return summary
+
+def format_summary(s):
+    values = dict(s, mbps=(s['throughput'] or 0) / 1e6, seconds=s['seconds'] or 0,
+                  first_byte='{:6.2f}s'.format(s['first_byte']) if s['first_byte'] is not None else '     -')
+    return ('{case:<12} {ok}/{runs} ok  {seconds:7.2f}s  {mbps:7.2f} MB/s  first byte {first_byte}  '
+            '{requests:5.0f} requests  {faults:3.0f} faults  {retries:3.0f} retries').format(**values)
+
+def benchmark(cases, runs=3, seconds=60, res=720, media_dir=MEDIA_DIR, faults=None, **config_args):
+    '''Run each case runs times against a local server; returns the per-case summaries.'''
+    workdir = tempfile.mkdtemp(prefix='ydl_benchmark_')
+    config = Config(res=res, download_location=os.path.join(workdir, ''), **config_args)
+    folder = os.path.join(media_dir, '{}p_{}s'.format(res, seconds))
+    if not make_media(folder, config, seconds):
+        shutil.rmtree(workdir, ignore_errors=True)
+        return []
+    server = MediaServer(folder, faults or Faults())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    summaries = []
+    try:
+        for name in cases:
+            results = [run_case(server, name, config) for _ in range(runs)]
+            summaries.append(summarize(results))
+            log.info(format_summary(summaries[-1]))
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return summaries
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m ydl_extreme.benchmark')
+    parser.add_argument('--cases', default=','.join(CASES),
+                        help='comma-separated cases to run (default: %(default)s)')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--seconds', type=int, default=60, help='length of the synthetic video')
+    parser.add_argument('--res', type=int, default=720)
+    parser.add_argument('--media', default=MEDIA_DIR, help='where the synthetic media is kept')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds before every response')
+    parser.add_argument('--rate', default=None, help='per-connection rate cap, e.g. 4M')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='share of requests that fail')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--stall-timeout', type=int, default=120)
+    parser.add_argument('--stall-retries', type=int, default=2)
+    parser.add_argument('--bandwidth', default=None)
+    parser.add_argument('--json', dest='json_path', help='also write the results to this file')
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    cases = [c.strip() for c in args.cases.split(',') if c.strip()]
+    unknown = [c for c in cases if c not in CASES]
+    if unknown:
+        parser.error('unknown case(s): {}'.format(', '.join(unknown)))
+    import logging
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s :: %(levelname)s :: %(message)s')
+    faults = Faults(args.latency, parse_rate(args.rate), args.error_rate, args.seed)
+    summaries = benchmark(cases, args.runs, args.seconds, args.res, args.media, faults,
+                          stall_timeout=args.stall_timeout, stall_retries=args.stall_retries,
+                          bandwidth=args.bandwidth)
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'faults': {'latency': args.latency, 'rate': args.rate, 'error_rate': args.error_rate,
+                                  'seed': args.seed}, 'results': summaries}, f, indent=1)
+
+if __name__ == '__main__':
+    main()
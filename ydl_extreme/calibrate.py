@@ -0,0 +1,115 @@
+'''Per-machine encoder calibration (-calibrate).
+
+ffmpeg has several ways to produce the same output: the prores and
+prores_ks encoders, different thread counts and, for prores_ks, slice
+sizes.  Which is fastest depends on the build and the CPU.  -calibrate
+encodes a short synthetic clip at the configured size and frame rate with
+each candidate and measures its fps.  Candidates whose output doesn't
+match the requested encoding's codec, profile and pixel format are thrown
+out.  The fastest is stored per host in CALIBRATION_FILE, and transcode()
+uses it from then on in place of -encoding.
+'''
+
+import json
+import os
+import shutil
+import socket
+import tempfile
+import time
+
+from .logs import log
+from .probe import get_metadata, get_video_stream
+from .process import run
+from .templates import FFMPEG_CALIBRATE
+
+CALIBRATION_FILE = os.path.expanduser('~/.ydl_extreme_calibration.json')
+CALIBRATION_SECONDS = 3
+PRORES_ENCODERS = ['prores', 'prores_ks']
+
+
+def calibration_key(config):
+    return '{}@{}x{}@{}'.format(config.encoding, config.width, config.height, config.framerate)
+
+def candidates(encoding):
+    '''Encoder settings that should give the same output as encoding, requested first.'''
+    parts = encoding.split()
+    encoder, options = parts[0], parts[1:]
+    threads = [[], ['-threads', str(os.cpu_count() or 1)]]
+    if encoder in PRORES_ENCODERS + ['prores_aw']:
+        variants = [[e] + options + t for e in PRORES_ENCODERS for t in threads]
+        # prores_ks accepts 1-8 macroblocks per slice (default 8)
+        variants += [['prores_ks'] + options + ['-mbs_per_slice', str(n)] for n in (4, 8)]
+    else:
+        variants = [[encoder] + options + t for t in threads]
+    result = [encoding]
+    for variant in variants:
+        if ' '.join(variant) not in result:
+            result.append(' '.join(variant))
+    return result
+
+def output_signature(path):
+    stream = get_video_stream(get_metadata(path))
+    return (stream.get('codec_name'), stream.get('profile'), stream.get('pix_fmt'))
+
+def benchmark(encoding, config, workdir):
+    '''Return (fps, output signature) for encoding, or (None, None) if it failed.'''
+    outpath = os.path.join(workdir, 'calibrate.mkv')
+    frames = int(CALIBRATION_SECONDS * config.framerate)
+    proc = []
+    for arg in FFMPEG_CALIBRATE:
+        if arg == '{encoding}':
+            proc.extend(encoding.split())
+            continue
+        proc.append(arg.format(width=config.width, height=config.height, framerate=config.framerate,
+                               length=CALIBRATION_SECONDS, outpath=outpath))
+    started = time.monotonic()
+    if not run(proc):
+        return None, None
+    elapsed = time.monotonic() - started
+    signature = output_signature(outpath)
+    os.remove(outpath)
+    return frames / elapsed, signature
+
+def load_calibration():
+    try:
+        with open(CALIBRATION_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def calibrate(config):
+    '''Benchmark the candidates for config.encoding and store the fastest for this host.'''
+    workdir = tempfile.mkdtemp(prefix='ydl_calibrate_')
+    results = {}
+    try:
+        expected = None
+        for encoding in candidates(config.encoding):
+            fps, signature = benchmark(encoding, config, workdir)
+            if fps is None and expected is None:
+                log.warning('The requested encoding failed: {}'.format(encoding))
+                return None
+            if fps is None:
+                log.info('{:<50} failed'.format(encoding))
+                continue
+            if expected is None:
+                expected = signature
+            elif signature != expected:
+                log.info('{:<50} {:7.1f} fps, different output {}'.format(encoding, fps, signature))
+                continue
+            log.info('{:<50} {:7.1f} fps'.format(encoding, fps))
+            results[encoding] = round(fps, 1)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    best = max(results, key=results.get)
+    calibration = load_calibration()
+    calibration.setdefault(socket.gethostname(), {})[calibration_key(config)] = {
+        'encoding': best, 'fps': results[best], 'results': results}
+    with open(CALIBRATION_FILE, 'w') as f:
+        json.dump(calibration, f, indent=1)
+    log.info('Fastest on this machine: {} ({} fps)'.format(best, results[best]))
+    return best
+
+def tuned_encoding(config):
+    '''The calibrated fastest equivalent of config.encoding on this host, or config.encoding.'''
+    entry = load_calibration().get(socket.gethostname(), {}).get(calibration_key(config))
+    return entry['encoding'] if entry else config.encoding
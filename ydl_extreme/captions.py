@@ -0,0 +1,139 @@
+'''Caption preprocessing: pick one track, convert it to ASS once, clip and cache it.
+
+The subtitles filter used to get the raw downloaded track and parse and
+convert all of it inside every encode.  Now the track is converted to ASS
+once (cached by content hash in the download location), then only the
+events overlapping the trim window are kept, shifted so the clip starts at
+zero, and that clipped file is cached as well.
+
+Chapter encodes prepare captions in parallel, so every cache file is
+written to its own temporary file and renamed into place.  An empty
+conversion is never cached.
+'''
+
+import hashlib
+import os
+import re
+import tempfile
+
+from .logs import log
+from .process import run
+from .templates import FFMPEG_CAPTIONS_ASS
+
+# Languages requested from YouTube, most preferred first
+CAPTION_LANGS = ['en', 'en-nP7-2PuUl7o']
+# Caption formats, best converted first
+CAPTION_FORMAT_RANK = ['.ass', '.ssa', '.srt', '.vtt', '.ttml', '.dfxp', '.sbv', '.sub']
+CACHE_DIR = '.captions'
+
+ASS_TIME_RE = re.compile(r'(\d+):(\d{2}):(\d{2})\.(\d{2})')
+
+
+def track_language(path):
+    '''Language code from a yt-dlp caption name like title.en.vtt, or None.'''
+    parts = os.path.basename(path).split('.')
+    return parts[-2] if len(parts) > 2 else None
+
+def pick_track(paths):
+    '''Choose one caption track: preferred language, then format, then name.'''
+    def rank(path):
+        lang = track_language(path)
+        ext = os.path.splitext(path)[1].lower()
+        return (CAPTION_LANGS.index(lang) if lang in CAPTION_LANGS else len(CAPTION_LANGS),
+                CAPTION_FORMAT_RANK.index(ext) if ext in CAPTION_FORMAT_RANK else len(CAPTION_FORMAT_RANK),
+                os.path.basename(path))
+    return min(paths, key=rank) if paths else None
+
+def parse_ass_time(value):
+    match = ASS_TIME_RE.match(value.strip())
+    if not match:
+        return None
+    h, m, s, cs = (int(x) for x in match.groups())
+    return h * 3600 + m * 60 + s + cs / 100.0
+
+def format_ass_time(seconds):
+    cs = int(round(max(seconds, 0) * 100))
+    return '{}:{:02d}:{:02d}.{:02d}'.format(cs // 360000, cs // 6000 % 60, cs // 100 % 60, cs % 100)
+
+def clip_events(lines, offset, length):
+    '''Keep Dialogue lines overlapping [offset, offset + length), shifted back by offset.'''
+    section = fields = None
+    result = []
+    for line in lines:
+        if line.startswith('['):
+            section = line.strip().lower()
+        elif section == '[events]' and line.startswith('Format:'):
+            fields = [f.strip() for f in line[len('Format:'):].split(',')]
+        if not line.startswith('Dialogue:') or fields is None:
+            result.append(line)
+            continue
+        values = line[len('Dialogue:'):].split(',', len(fields) - 1)
+        start = parse_ass_time(values[fields.index('Start')])
+        end = parse_ass_time(values[fields.index('End')])
+        if start is None or end is None or end <= offset or start >= offset + length:
+            continue
+        values[fields.index('Start')] = format_ass_time(start - offset)
+        values[fields.index('End')] = format_ass_time(min(end, offset + length) - offset)
+        result.append('Dialogue:' + ','.join(values))
+    return result
+
+def temp_path(cache, suffix):
+    '''A new, unique temporary file in the cache folder.'''
+    fd, path = tempfile.mkstemp(suffix=suffix, prefix='.tmp', dir=cache)
+    os.close(fd)
+    return path
+
+def convert_to_ass(path, cache):
+    '''Convert a caption file to ASS, reusing an earlier conversion of the same content.'''
+    with open(path, 'rb') as f:
+        digest = hashlib.blake2b(f.read(), digest_size=16).hexdigest()
+    if os.path.splitext(path)[1].lower() == '.ass':
+        return path, digest
+    converted = os.path.join(cache, digest + '.ass')
+    if not os.path.exists(converted):
+        tmp = temp_path(cache, '.ass')
+        try:
+            proc = [arg.format(inpath=path, outpath=tmp) for arg in FFMPEG_CAPTIONS_ASS]
+            if not run(proc) or not os.path.getsize(tmp):
+                return None, digest
+            os.replace(tmp, converted)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    return converted, digest
+
+def cache_folder(config):
+    cache = os.path.join(config.download_location, CACHE_DIR)
+    os.makedirs(cache, exist_ok=True)
+    return cache
+
+def convert_captions(job):
+    '''Convert the job's caption track to ASS ahead of time; returns the ASS file or None.'''
+    return convert_to_ass(job.files['captions'], cache_folder(job.config))[0]
+
+def prepare_captions(job, offset, length):
+    '''Return an ASS file holding only the captions for the encoded clip.
+
+    offset is where the clip starts in the caption track's timeline (the
+    in-point plus job.source_offset) and length its duration.  Returns None
+    if the track can't be converted.
+    '''
+    cache = cache_folder(job.config)
+    converted, digest = convert_to_ass(job.files['captions'], cache)
+    if converted is None:
+        log.warning('Could not convert captions, encoding without them')
+        return None
+    clipped = os.path.join(cache, '{}-{:.2f}-{:.2f}.ass'.format(digest, offset, length))
+    if not os.path.exists(clipped):
+        with open(converted, encoding='utf-8-sig') as f:
+            lines = f.read().splitlines()
+        tmp = temp_path(cache, '.ass')
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(clip_events(lines, offset, length)) + '\n')
+            os.replace(tmp, clipped)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    log.info('Captions: {}'.format(os.path.basename(job.files['captions'])))
+    return clipped
@@ -0,0 +1,64 @@
+'''Chapter mode: one output file per chapter from a single download.
+
+Chapters come from the yt-dlp info dict (shifted onto a partial download
+by job.source_offset) or, for local files and sites without chapter data,
+from ffprobe.  Each chapter becomes a copy of the job trimmed to that
+chapter (and to the job's own trim, if any), named after its title;
+encode_chapters() in encode.py runs them in parallel.
+'''
+
+import copy
+import json
+import os
+import re
+
+from .logs import log
+from .process import capture
+from .probe import get_duration
+from .timecode import format_time, parse_time
+
+# Chapters shorter than this after trimming are skipped
+MIN_CHAPTER_SECONDS = 0.5
+
+
+def get_file_chapters(path):
+    '''Chapters embedded in a media file, as [{start_time, end_time, title}].'''
+    proc = ['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_chapters', path]
+    chapters = json.loads(capture(proc) or '{}').get('chapters') or []
+    return [{'start_time': float(c['start_time']), 'end_time': float(c['end_time']),
+             'title': (c.get('tags') or {}).get('title')} for c in chapters]
+
+def get_chapters(job):
+    '''The job's chapters in the downloaded file's timeline.'''
+    chapters = (job.info or {}).get('chapters')
+    if chapters:
+        return [dict(c, start_time=c['start_time'] - job.source_offset,
+                     end_time=c['end_time'] - job.source_offset) for c in chapters]
+    return get_file_chapters(job.files['video'])
+
+def chapter_name(index, title):
+    '''File name stem for a chapter: number plus a filename-safe title.'''
+    safe = re.sub(r'[^\w\-]+', '_', title or '', flags=re.UNICODE).strip('_')
+    return '{:02d}_{}'.format(index, safe[:80]) if safe else '{:02d}'.format(index)
+
+def split_job(job):
+    '''Return a trimmed copy of the job for each chapter, or [] if there are none.'''
+    start = parse_time(job.inpoint) or 0
+    end = parse_time(job.outpoint)
+    if end is None:
+        end = get_duration(job.metadata) if job.metadata else None
+    stem = os.path.splitext(os.path.basename(job.files['video']))[0]
+    parts = []
+    for index, chapter in enumerate(get_chapters(job), 1):
+        chapter_start = max(chapter['start_time'], start)
+        chapter_end = chapter['end_time'] if end is None else min(chapter['end_time'], end)
+        if chapter_end - chapter_start < MIN_CHAPTER_SECONDS:
+            continue
+        part = copy.copy(job)
+        part.chapters = False
+        part.inpoint, part.outpoint = format_time(chapter_start), format_time(chapter_end)
+        part.output_name = '{}_{}'.format(stem, chapter_name(index, chapter.get('title')))
+        parts.append(part)
+    if not parts:
+        log.warning('No chapters found, encoding as a single file')
+    return parts
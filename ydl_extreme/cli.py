@@ -0,0 +1,130 @@
+'''The interactive prompt loop shared by youtube_dl_extreme.py and youtube_dl_extreme2.py.'''
+
+import os
+import sys
+
+from .calibrate import calibrate
+from .config import OPTIONS_FILE, parse_args
+from .download import download
+from .encode import encode
+from .files import check_path, cleanup, finalize
+from .job import Job
+from .logs import log, setup_logging
+from .prefetch import Prefetch
+from .preview import EXTRACT_TIMEOUT, preview
+from .probe import probe
+from .space import check_space
+from .urls import canonical_url
+from .prompts import (clear, get_audio, get_auto_captions, get_captions, get_legacy,
+                      get_mp4, get_norm, get_split_chapters, get_trim, get_url)
+from .watch import watch
+
+LOG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), 'ydli.log')
+PROFILE_PATH = os.path.splitext(LOG_PATH)[0] + '.prof'
+
+
+def intro_message(config):
+    log.info('-------------------------------------------------------------------------')
+    log.info('Follow instructions to download a YouTube video or convert a local video:')
+    log.info('Files will be downloaded to: {path}'.format(path=config.download_location))
+    if config.skip_encoding:
+        log.info('Not re-encoding video due to "-fast" option')
+    else:
+        log.info('Selected encoding format: {encoding} at {framerate} fps'.format(encoding=config.encoding, framerate=config.framerate))
+    log.info('Selected output resolution: {width}x{height}'.format(width=config.width, height=config.height))
+    log.info('-------------------------------------------------------------------------\n')
+
+def local_process(path, config):
+    starttime, runtime = get_trim(lambda: preview(path, config))
+    mp4 = get_mp4()
+    norm = get_norm()
+    audio = get_audio()
+    chapters = get_split_chapters() if not (audio or mp4 or config.skip_encoding) else False
+    return Job(path, config, inpoint=starttime, outpoint=runtime,
+               norm=norm, audio=audio, mp4=mp4, chapters=chapters)
+
+def show_url_preview(job):
+    info = job.prefetch.wait_for_info(EXTRACT_TIMEOUT)
+    if info is None:
+        log.warning('No preview available: the video could not be extracted yet')
+        return
+    preview(job.source, job.config, info)
+
+def youtube_process(url, config):
+    url = canonical_url(url)
+    job = Job(url, config)
+    if not config.skip_encoding:
+        # Start extracting and downloading the default format while the prompts are answered
+        job.prefetch = Prefetch(job).start()
+        #job.captions = get_captions()
+        #job.auto_captions = get_auto_captions() if job.captions else False
+        job.inpoint, job.outpoint = get_trim(lambda: show_url_preview(job))
+        job.norm = get_norm()
+        job.audio = get_audio()
+        job.mp4 = get_mp4()
+        if not job.audio:
+            job.captions = get_captions()
+            job.auto_captions = get_auto_captions() if job.captions else False
+        if not (job.audio or job.mp4):
+            job.chapters = get_split_chapters()
+        job.legacy = get_legacy()
+    return job
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    setup_logging(LOG_PATH)
+
+    # Create options.txt if it doesn't exist
+    if not os.path.exists(OPTIONS_FILE):
+        open(OPTIONS_FILE, 'w').close()
+    try:
+        config = parse_args(argv)
+    except ValueError as e:
+        log.warning(str(e))
+        return
+    if config.calibrate:
+        calibrate(config)
+        return
+    if not config.profile:
+        return process_all(config)
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    try:
+        profiler.runcall(process_all, config)
+    finally:
+        profiler.dump_stats(PROFILE_PATH)
+        log.info('Profile written to {}'.format(PROFILE_PATH))
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(30)
+
+def process_all(config):
+    '''Watch mode, or the interactive prompt loop.'''
+    if config.watch_dir:
+        intro_message(config)
+        watch(config)
+        return
+
+    while True:
+        cleanup(config)
+        clear()
+        intro_message(config)
+
+        url = get_url()
+        if check_path(url):
+            job = local_process(url, config)
+        else:
+            job = youtube_process(url, config)
+
+        if not check_space(job):
+            continue
+        download(job)
+        if job.duplicate:
+            continue
+        if not job.files.get('video'):
+            log.debug('Something went wrong, video not found.')
+            break # re-visit this
+
+        probe(job)
+        if not check_space(job):
+            continue
+        finalize(job, encode(job))
@@ -0,0 +1,133 @@
+'''Settings shared by every job, and the command-line/options.txt parser.'''
+
+import argparse
+import os
+
+from .bandwidth import parse_rate, parse_schedule
+
+RESOLUTIONS = {720: (1280, 720), 1080: (1920, 1080), 2160: (3840, 2160)}
+DOWNLOAD_LOCATION = os.path.expanduser('~/Desktop/YT_Downloads/')
+OPTIONS_FILE = 'options.txt'
+
+
+class Config(object):
+    '''What used to be the global args: output format and folder locations.
+
+    workers is a list of host:port encode workers (see distributed.py);
+    shared_storage means they see the same paths as this machine.
+    verify_duplicates confirms a re-ingested local file with a full hash
+    before reusing its earlier output (see fingerprint.py).
+    watch_dir switches the CLI to watch-folder mode, encoding watch_jobs
+    files at a time (see watch.py).
+    Downloads and encodes are staged in hidden folders under scratch_dir
+    (e.g. a fast local disk), or under download_location if not set.
+    bandwidth, job_bandwidth and bandwidth_schedule limit downloads (see
+    bandwidth.py for the formats); they are parsed once, into bandwidth_rate,
+    job_bandwidth_rate and schedule.
+    chapter_jobs is how many chapters of a chapter-mode job encode at once.
+    Encodes that make no progress for stall_timeout seconds are killed and
+    restarted, and stalled downloads reconnected, up to stall_retries times.
+    progressive writes encodes as fragmented files in download_location
+    while they run (see encode.transcode).
+    profile runs the CLI under cProfile and shows each job's process usage.
+    calibrate makes the CLI benchmark encoder settings and exit (see
+    calibrate.py).
+
+    Raises ValueError for a resolution other than 720, 1080 or 2160, or an
+    unreadable bandwidth setting.
+    '''
+
+    def __init__(self, res=1080, skip_encoding=False, encoding='prores -profile:v 2',
+                 framerate=59.94, audio_format='mp3', download_location=DOWNLOAD_LOCATION,
+                 workers=None, shared_storage=False, verify_duplicates=False,
+                 watch_dir=None, watch_jobs=2, scratch_dir=None,
+                 bandwidth=None, job_bandwidth=None, bandwidth_schedule=None,
+                 calibrate=False, progressive=False, chapter_jobs=2,
+                 stall_timeout=120, stall_retries=2, profile=False):
+        if res not in RESOLUTIONS:
+            raise ValueError('Unsupported resolution for -res argument.  '
+                             'Supported resolutions are: 720, 1080, 2160')
+        self.res = res
+        self.width, self.height = RESOLUTIONS[res]
+        self.skip_encoding = skip_encoding
+        self.encoding = encoding
+        self.framerate = framerate
+        self.audio_format = audio_format
+        self.download_location = download_location
+        self.workers = list(workers or [])
+        self.shared_storage = shared_storage
+        self.verify_duplicates = verify_duplicates
+        self.watch_dir = watch_dir
+        self.watch_jobs = watch_jobs
+        self.bandwidth = bandwidth
+        self.job_bandwidth = job_bandwidth
+        self.bandwidth_schedule = bandwidth_schedule
+        self.bandwidth_rate = parse_rate(bandwidth)
+        self.job_bandwidth_rate = parse_rate(job_bandwidth)
+        self.schedule = parse_schedule(bandwidth_schedule)
+        self.calibrate = calibrate
+        self.progressive = progressive
+        self.chapter_jobs = chapter_jobs
+        self.stall_timeout = stall_timeout
+        self.stall_retries = stall_retries
+        self.profile = profile
+        self.scratch = scratch_dir or download_location
+        self.downloading = os.path.join(self.scratch, '.downloading/')
+        self.encoding_dir = os.path.join(self.scratch, '.encoding/')
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(fromfile_prefix_chars='@')
+    parser.add_argument('-res', type=int, default=1080)
+    parser.add_argument('-profile', '--profile', action='store_true', default=False)
+    parser.add_argument('-progressive', action='store_true', default=False)
+    parser.add_argument('-fast', '--skip-encoding', action='store_true', default=False)
+    parser.add_argument('-encoding', type=str, default='prores -profile:v 2')
+    parser.add_argument('-framerate', type=float, default=59.94)
+    parser.add_argument('-audio-format', type=str, default='mp3', choices=['mp3', 'm4a', 'opus'])
+    parser.add_argument('-bandwidth', type=str, default=None)
+    parser.add_argument('-job-bandwidth', type=str, default=None)
+    parser.add_argument('-bandwidth-schedule', type=str, default=None)
+    parser.add_argument('-calibrate', '--calibrate', action='store_true', default=False)
+    parser.add_argument('-chapter-jobs', type=int, default=2)
+    parser.add_argument('-download-location', type=str, default=DOWNLOAD_LOCATION)
+    parser.add_argument('-scratch', type=str, default=None)
+    parser.add_argument('-workers', type=str, default='')
+    parser.add_argument('-shared-storage', action='store_true', default=False)
+    parser.add_argument('-stall-timeout', type=int, default=120)
+    parser.add_argument('-stall-retries', type=int, default=2)
+    parser.add_argument('-verify-duplicates', action='store_true', default=False)
+    parser.add_argument('-watch', type=str, default=None)
+    parser.add_argument('-watch-jobs', type=int, default=2)
+    return parser
+
+def parse_args(argv, options_file=OPTIONS_FILE):
+    '''Build a Config from options_file (if it exists) followed by argv.
+
+    Command-line arguments supersede the ones in options_file.
+    '''
+    argv = list(argv)
+    if options_file and os.path.exists(options_file):
+        argv = ['@' + options_file] + argv
+    args = build_parser().parse_args(argv)
+    return Config(res=args.res,
+                  skip_encoding=args.skip_encoding,
+                  encoding=args.encoding,
+                  framerate=args.framerate,
+                  audio_format=args.audio_format,
+                  download_location=os.path.join(os.path.expanduser(args.download_location), ''),
+                  scratch_dir=os.path.expanduser(args.scratch) if args.scratch else None,
+                  workers=[w.strip() for w in args.workers.split(',') if w.strip()],
+                  shared_storage=args.shared_storage,
+                  verify_duplicates=args.verify_duplicates,
+                  watch_dir=args.watch,
+                  watch_jobs=args.watch_jobs,
+                  bandwidth=args.bandwidth,
+                  job_bandwidth=args.job_bandwidth,
+                  bandwidth_schedule=args.bandwidth_schedule,
+                  calibrate=args.calibrate,
+                  progressive=args.progressive,
+                  chapter_jobs=args.chapter_jobs,
+                  stall_timeout=args.stall_timeout,
+                  stall_retries=args.stall_retries,
+                  profile=args.profile)
@@ -0,0 +1,269 @@
+'''Coordinator/worker mode for spreading the video encode over several machines.
+
+Workers are small HTTP servers that run ffmpeg on one segment at a time:
+
+    python -m ydl_extreme.distributed worker --host 0.0.0.0 --port 8701
+
+The coordinator (an encode with -workers host:port,...) splits the source
+at keyframes into SEGMENT_SECONDS pieces, hands each to a free worker,
+retries failed segments on other workers, then joins the encoded pieces
+with the concat demuxer while encoding the audio itself.
+
+With -shared-storage the workers read the source and write their output
+through the same paths as the coordinator (e.g. an NFS/SMB mount, or
+several worker processes on one machine).  Otherwise each segment is cut
+with stream copy, uploaded in the request body and the encoded piece is
+sent back in the response.
+
+Workers run whatever ffmpeg arguments the coordinator sends, so only
+expose them on a trusted network.
+'''
+
+import argparse
+import json
+import os
+import queue
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import URLError
+from urllib.request import Request, urlopen
+
+from .accounting import propagate
+from .logs import log, log_file_only
+from .probe import get_keyframes
+from .process import run
+from .templates import FFMPEG_DISTRIBUTED_JOIN, FFMPEG_SEGMENT_SPLIT
+from .timecode import format_time
+
+DEFAULT_PORT = 8701
+SEGMENT_SECONDS = 60
+SEGMENT_RETRIES = 3
+# A worker failing this many segments is taken out of rotation for the job
+WORKER_FAILURES = 2
+SEGMENT_TIMEOUT = 6 * 3600
+CHUNK_SIZE = 1024 * 1024
+# Seeking this far past a keyframe still lands on it, whatever pts_time rounding did
+SEEK_EPSILON = 0.001
+
+
+class SegmentError(Exception):
+    pass
+
+
+class WorkerHandler(BaseHTTPRequestHandler):
+    '''GET /health reports the worker is up; POST /encode encodes one segment.
+
+    The X-Encode header carries a JSON spec: seek, length and args for
+    ffmpeg, plus either inpath/outpath (shared storage) or in_ext/out_ext
+    (the segment is the request body and the result the response body).
+    '''
+
+    def log_message(self, format, *args):
+        log_file_only.info('worker {}: {}'.format(self.address_string(), format % args))
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path != '/health':
+            return self.send_json(404, {'error': 'not found'})
+        self.send_json(200, {'ok': True})
+
+    def do_POST(self):
+        if self.path != '/encode':
+            return self.send_json(404, {'error': 'not found'})
+        try:
+            spec = json.loads(self.headers['X-Encode'])
+        except (TypeError, ValueError):
+            return self.send_json(400, {'error': 'missing or invalid X-Encode header'})
+        tmpdir = tempfile.mkdtemp(prefix='ydl_worker_')
+        try:
+            shared = bool(spec.get('inpath'))
+            if shared:
+                inpath, outpath = spec['inpath'], spec['outpath']
+            else:
+                inpath = os.path.join(tmpdir, 'segment' + spec['in_ext'])
+                outpath = os.path.join(tmpdir, 'encoded' + spec['out_ext'])
+                remaining = int(self.headers.get('Content-Length', 0))
+                with open(inpath, 'wb') as f:
+                    while remaining:
+                        chunk = self.rfile.read(min(CHUNK_SIZE, remaining))
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                        remaining -= len(chunk)
+            proc = (['ffmpeg', '-y', '-ss', spec['seek'], '-i', inpath, '-t', spec['length']] +
+                    spec['args'] + [outpath])
+            if not run(proc):
+                return self.send_json(500, {'error': 'ffmpeg failed'})
+            if shared:
+                return self.send_json(200, {'ok': True})
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(os.path.getsize(outpath)))
+            self.end_headers()
+            with open(outpath, 'rb') as f:
+                shutil.copyfileobj(f, self.wfile, CHUNK_SIZE)
+        finally:
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def serve(host='127.0.0.1', port=DEFAULT_PORT):
+    '''Run a worker until interrupted.'''
+    server = ThreadingHTTPServer((host, port), WorkerHandler)
+    log.info('Encode worker listening on {}:{}'.format(host, port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def plan_segments(keyframes, start, end, seconds=SEGMENT_SECONDS):
+    '''Split [start, end) at keyframes into pieces of at least `seconds`.
+
+    Returns (origin, clip_start, clip_end) tuples: origin is the keyframe
+    the piece is decoded from, clip_start/clip_end the part actually kept.
+    '''
+    before = [k for k in keyframes if k <= start]
+    boundaries = [before[-1] if before else start]
+    for k in keyframes:
+        if start < k < end and k - boundaries[-1] >= seconds:
+            boundaries.append(k)
+    boundaries.append(end)
+    return [(boundaries[i], max(start, boundaries[i]), boundaries[i + 1])
+            for i in range(len(boundaries) - 1)]
+
+def check_worker(worker):
+    try:
+        with urlopen('http://{}/health'.format(worker), timeout=5) as response:
+            return response.status == 200
+    except (URLError, OSError, ValueError):
+        return False
+
+def send_segment(worker, spec, segment_path=None, outpath=None):
+    '''POST one segment to a worker; in upload mode save the returned piece to outpath.'''
+    headers = {'X-Encode': json.dumps(spec)}
+    if segment_path:
+        body = open(segment_path, 'rb')
+        headers['Content-Length'] = str(os.path.getsize(segment_path))
+    else:
+        body = b''
+    try:
+        request = Request('http://{}/encode'.format(worker), data=body, headers=headers, method='POST')
+        with urlopen(request, timeout=SEGMENT_TIMEOUT) as response:
+            if segment_path:
+                with open(outpath, 'wb') as f:
+                    shutil.copyfileobj(response, f, CHUNK_SIZE)
+    finally:
+        if segment_path:
+            body.close()
+
+def encode_segment(index, segment, source, video_args, ext, workdir, shared, free, failures):
+    '''Encode one segment on whichever worker is free, retrying on others.'''
+    origin, clip_start, clip_end = segment
+    piece = os.path.join(workdir, 'piece{:04d}{}'.format(index, ext))
+    if shared:
+        spec = {'inpath': source, 'outpath': piece, 'seek': format_time(clip_start)}
+        upload = None
+    else:
+        # Cut the GOPs this piece needs (plus slack) with stream copy; the
+        # worker then trims exactly with -ss/-t relative to the keyframe
+        upload = os.path.join(workdir, 'segment{:04d}.mkv'.format(index))
+        proc = [arg.format(inpath=source, startpoint=format_time(origin + SEEK_EPSILON),
+                           length=format_time(clip_end - origin + 1), outpath=upload)
+                for arg in FFMPEG_SEGMENT_SPLIT]
+        if not run(proc):
+            raise SegmentError('could not cut segment {}'.format(index))
+        spec = {'in_ext': '.mkv', 'out_ext': ext, 'seek': format_time(clip_start - origin)}
+    spec.update({'length': format_time(clip_end - clip_start), 'args': video_args})
+
+    try:
+        for attempt in range(SEGMENT_RETRIES):
+            worker = free.get()
+            try:
+                log_file_only.info('Segment {} -> {} (attempt {})'.format(index, worker, attempt + 1))
+                send_segment(worker, spec, upload, piece)
+                free.put(worker)
+                return piece
+            except (URLError, OSError, ValueError) as e:
+                log.warning('Segment {} failed on {}: {}'.format(index, worker, e))
+                failures[worker] = failures.get(worker, 0) + 1
+                if failures[worker] < WORKER_FAILURES or free.empty():
+                    free.put(worker)
+        raise SegmentError('segment {} failed {} times'.format(index, SEGMENT_RETRIES))
+    finally:
+        if upload and os.path.exists(upload):
+            os.remove(upload)
+
+def distributed_encode(job, video_args, start, end, outpath, audio_filter=''):
+    '''Encode [start, end) of the job's video on the configured workers.
+
+    video_args are the ffmpeg output arguments for the video stream (filters,
+    codec, frame rate).  Audio is encoded here while joining.  Returns True
+    on success; False means the caller should encode locally.
+    '''
+    config = job.config
+    source = job.files['video']
+    workers = [w for w in config.workers if check_worker(w)]
+    if not workers:
+        log.warning('No encode workers reachable: {}'.format(', '.join(config.workers)))
+        return False
+    segments = plan_segments(get_keyframes(source), start, end)
+    ext = os.path.splitext(outpath)[1]
+    # Unique per call: chapter mode can run several distributed encodes at once
+    workdir = tempfile.mkdtemp(prefix='.segments_', dir=job.encoding_dir)
+    log.info('Distributing {} segments over {} workers'.format(len(segments), len(workers)))
+
+    free = queue.Queue()
+    for worker in workers:
+        free.put(worker)
+    failures = {}
+    try:
+        with ThreadPoolExecutor(max_workers=len(workers)) as pool:
+            futures = [pool.submit(propagate(encode_segment), i, segment, source, video_args, ext,
+                                   workdir, config.shared_storage, free, failures)
+                       for i, segment in enumerate(segments)]
+            pieces = [future.result() for future in futures]
+        listpath = os.path.join(workdir, 'pieces.txt')
+        with open(listpath, 'w') as f:
+            for piece in pieces:
+                f.write("file '{}'\n".format(piece))
+        proc = []
+        for arg in FFMPEG_DISTRIBUTED_JOIN:
+            if arg == '{audio_filter}':
+                proc.extend(['-af', audio_filter] if audio_filter else [])
+                continue
+            proc.append(arg.format(listpath=listpath, inpath=source, startpoint=format_time(start),
+                                   length=format_time(end - start), outpath=outpath))
+        return run(proc)
+    except SegmentError as e:
+        log.warning('Distributed encode failed: {}'.format(e))
+        return False
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m ydl_extreme.distributed')
+    sub = parser.add_subparsers(dest='command')
+    worker = sub.add_parser('worker', help='run an encode worker')
+    worker.add_argument('--host', default='127.0.0.1')
+    worker.add_argument('--port', type=int, default=DEFAULT_PORT)
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    if args.command != 'worker':
+        parser.print_help()
+        return
+    import logging
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s :: %(levelname)s :: %(message)s')
+    serve(args.host, args.port)
+
+if __name__ == '__main__':
+    main()
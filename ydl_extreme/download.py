@@ -0,0 +1,299 @@
+'''Downloading with yt-dlp (or legacy youtube-dl) and copying local files.'''
+
+import copy
+import os
+import re
+import shutil
+
+from .accounting import children, staged
+from .bandwidth import get_limiter
+from .captions import CAPTION_LANGS
+from .files import get_files, make_dirs
+from .session import SOCKET_TIMEOUT, downloader, extract_info
+from .fingerprint import find_duplicate
+from .logs import log, log_file_only
+from .templates import AUDIO_OUTPUTS
+from .timecode import format_time, get_trim_range, rebase_time
+
+YDL_COMMON_OPTS = {'restrictfilenames': True,
+                   'outtmpl': '{path}%(title)s.%(ext)s',
+                   'subtitleslangs': CAPTION_LANGS,
+                   'format': 'bestvideo+bestaudio/best'}
+YDL_OPTS_SPECIFIC_RES = {'format': 'bestvideo[width={width}][height={height}][ext=mp4]+bestaudio[ext=m4a]'}
+YDL_OPTS_BEST_RES = {'format': 'bestvideo+bestaudio/best'}
+YDL_OPTS_AUDIO = {'format': 'bestaudio/best'}
+# Seconds fetched ahead of a trim in-point so the partial download starts on a keyframe
+KEYFRAME_MARGIN = 10
+# Relative decode cost of the video codecs YouTube serves, cheapest first
+CODEC_COST = [('avc1', 0), ('h264', 0), ('vp09', 1), ('vp9', 1), ('av01', 2), ('av1', 2)]
+# Formats within this factor of the smallest candidate count as "comparable" in size
+SIZE_TOLERANCE = 1.5
+
+
+def get_backend(legacy):
+    '''Import yt_dlp, or youtube_dl for legacy jobs, on first use.'''
+    if legacy:
+        import youtube_dl
+        return youtube_dl
+    import yt_dlp
+    return yt_dlp
+
+def check_url(url):
+    '''Check if URL is valid'''
+    from urllib.request import urlopen
+    from urllib.error import URLError
+    try:
+        urlopen(url)
+        return True
+    except (URLError, ValueError):
+        return False
+
+def codec_cost(vcodec):
+    '''Return relative decode cost of a video codec string (lower is cheaper).'''
+    vcodec = (vcodec or '').lower()
+    for prefix, cost in CODEC_COST:
+        if vcodec.startswith(prefix):
+            return cost
+    return len(CODEC_COST)
+
+def format_size(fmt, duration):
+    '''Best guess at a format's size in bytes from filesize, filesize_approx or tbr.'''
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if size:
+        return size
+    if fmt.get('tbr') and duration:
+        return fmt['tbr'] * 1000 / 8 * duration
+    return None
+
+def is_audio_codec(acodec, codecs):
+    '''Check if an acodec string (e.g. "mp4a.40.2", "aac") is one of codecs.'''
+    acodec = (acodec or '').lower()
+    return any(acodec.startswith(codec) for codec in codecs)
+
+def select_format(info, target_width, target_height, logger=log):
+    '''Pick the cheapest format string that still fills the target box.
+
+    A rung fills the box if it reaches the target width or height, as the
+    letterbox/scale step sees it: a 2.39:1 film's 1920x804 rung is enough for
+    1920x1080.  Takes the smallest rung that fills it (or the tallest one
+    available if nothing does), then among formats of that height prefers
+    cheap-to-decode codecs (avc1 > vp9 > av1) unless they are much larger than
+    the smallest candidate.  Returns None if the info dict has no usable formats.
+    '''
+    formats = info.get('formats') or []
+    duration = info.get('duration')
+    videos = [f for f in formats if f.get('vcodec') != 'none' and f.get('height')]
+    audios = [f for f in formats if f.get('vcodec') == 'none' and f.get('acodec') not in (None, 'none')]
+    video_only = [f for f in videos if f.get('acodec') == 'none']
+    if video_only and audios:
+        videos = video_only
+    if not videos:
+        return None
+
+    filling = [f for f in videos if (f.get('width') or 0) >= target_width or f['height'] >= target_height]
+    height = min(f['height'] for f in filling) if filling else max(f['height'] for f in videos)
+    candidates = [f for f in videos if f['height'] == height]
+    sizes = [format_size(f, duration) for f in candidates]
+    known = [size for size in sizes if size]
+    if known:
+        limit = min(known) * SIZE_TOLERANCE
+        candidates = [f for f, size in zip(candidates, sizes) if not size or size <= limit]
+    candidates.sort(key=lambda f: (codec_cost(f.get('vcodec')),
+                                   format_size(f, duration) or float('inf'),
+                                   -(f.get('fps') or 0)))
+    video = candidates[0]
+    size = format_size(video, duration)
+    logger.info('Selected video format {id}: {width}x{height} {vcodec} {fps}fps, ~{size} (target {target})'.format(
+        id=video.get('format_id'), width=video.get('width'), height=video.get('height'),
+        vcodec=video.get('vcodec'), fps=video.get('fps') or '?', target='{}x{}'.format(target_width, target_height),
+        size='{:.1f} MB'.format(size / 1e6) if size else 'unknown size'))
+    log_file_only.info('Rejected video formats: {}'.format(
+        [(f.get('format_id'), f.get('height'), f.get('vcodec')) for f in videos if f is not video]))
+    if video.get('acodec') not in (None, 'none') or not audios:
+        return video['format_id']
+
+    # m4a merges into mp4 with avc1; anything else ends up in mkv/webm anyway
+    audios.sort(key=lambda f: (f.get('ext') == 'm4a' and video.get('ext') == 'mp4',
+                               f.get('abr') or f.get('tbr') or 0), reverse=True)
+    audio = audios[0]
+    logger.info('Selected audio format {id}: {acodec} {abr}kbps'.format(
+        id=audio.get('format_id'), acodec=audio.get('acodec'), abr=audio.get('abr')))
+    return '{}+{}'.format(video['format_id'], audio['format_id'])
+
+def select_audio_format(info, audio_format, logger=log):
+    '''Pick the best audio-only format, preferring one that can be copied to audio_format.'''
+    formats = info.get('formats') or []
+    audios = [f for f in formats if f.get('vcodec') == 'none' and f.get('acodec') not in (None, 'none')]
+    if not audios:
+        return None
+    codecs, preferred_ext = AUDIO_OUTPUTS[audio_format][1:3]
+    audios.sort(key=lambda f: (is_audio_codec(f.get('acodec'), codecs) or f.get('ext') == preferred_ext,
+                               f.get('abr') or f.get('tbr') or 0), reverse=True)
+    audio = audios[0]
+    logger.info('Selected audio-only format {id}: {acodec} {abr}kbps'.format(
+        id=audio.get('format_id'), acodec=audio.get('acodec'), abr=audio.get('abr')))
+    return audio['format_id']
+
+def ydl_options(job):
+    '''Build the YoutubeDL options for a job (without the format selection).
+
+    Includes the bandwidth limiter's progress hook and ratelimit when a
+    limit is set (trimmed downloads go through ffmpeg and aren't limited,
+    see bandwidth.py), followed by any in job.progress_hooks.
+    '''
+    config = job.config
+    ydl_opts = YDL_COMMON_OPTS.copy()
+    ydl_opts.update({'outtmpl': YDL_COMMON_OPTS['outtmpl'].format(path=job.downloading),
+                     'logger': log,
+                     'socket_timeout': min(SOCKET_TIMEOUT, config.stall_timeout)})
+    hooks = list(job.progress_hooks)
+    limiter = get_limiter(config)
+    if limiter:
+        hooks.insert(0, limiter.hook())
+        if limiter.fixed_rate():
+            ydl_opts['ratelimit'] = limiter.fixed_rate()
+    if hooks:
+        ydl_opts['progress_hooks'] = hooks
+    if config.skip_encoding:
+        pass
+    elif job.auto_captions:
+        ydl_opts.update({'writeautomaticsub': True})
+    elif job.captions:
+        ydl_opts.update({'writesubtitles': True})
+    return ydl_opts
+
+def download_video(job):
+    '''Try to download YouTube video in specific resolution.
+
+    Extracts the available formats first and picks the smallest one at or above
+    the target resolution (see select_format).  Falls back to
+    bestvideo+bestaudio/best if nothing usable is found.  Audio-only jobs
+    download the audio stream alone.
+
+    If the job is trimmed, only that range plus KEYFRAME_MARGIN seconds of
+    lead-in is fetched, and the job's trim points are rebased onto the
+    partial file (job.source_offset records where it starts).
+
+    The resolved info dict of the downloaded format is kept on job.info so
+    probe() can skip ffprobe.
+
+    If a Prefetch was started for the job its download is used when it still
+    fits the answers, otherwise it is cancelled and only its extracted info
+    is reused.
+    '''
+    config = job.config
+    backend = get_backend(job.legacy)
+    prefetch = job.prefetch
+    if prefetch and prefetch.plan(job):
+        log.info('Using prefetched download')
+        job.info = prefetch.result
+        if not config.skip_encoding and (job.captions or job.auto_captions):
+            fetch_captions(job, backend, prefetch.info)
+        return
+    info = prefetch.info if prefetch and not job.legacy else None
+
+    ydl_opts = ydl_options(job)
+    specific_res = {'format': YDL_OPTS_SPECIFIC_RES['format'].format(width=config.width, height=config.height)}
+    ydl_opts.update(YDL_OPTS_AUDIO if job.audio else specific_res)
+
+    trim = get_trim_range(job.inpoint, job.outpoint) if not config.skip_encoding else None
+    offset = 0
+    if trim and job.legacy:
+        log.warning('Legacy downloader cannot fetch partial ranges, downloading the whole video.')
+    elif trim:
+        offset = max(trim[0] - KEYFRAME_MARGIN, 0)
+        end = trim[1] if trim[1] is not None else float('inf')
+        log.info('Downloading range {} - {}'.format(format_time(offset), format_time(end) if trim[1] is not None else 'end'))
+        ydl_opts.update({'download_ranges': backend.utils.download_range_func(None, [(offset, end)])})
+        job.download_range = (offset, end)
+
+    job.info = fetch(job, backend, ydl_opts, info)
+    if offset:
+        job.source_offset = offset
+        job.inpoint = rebase_time(job.inpoint, offset) or format_time(trim[0] - offset)
+        job.outpoint = rebase_time(job.outpoint, offset)
+
+def fetch(job, backend, ydl_opts, info=None):
+    '''Extract, select a format and download, falling back to plain format strings.
+
+    info may be an already extracted (unprocessed) info dict to skip
+    extraction.  Returns the info dict yt-dlp/youtube-dl resolved for the
+    download, or None if it failed.
+    '''
+    if info is None:
+        try:
+            info = extract_info(backend, job.source)
+        except backend.utils.DownloadError as e:
+            log.warning('Could not extract formats: {}'.format(e))
+            info = None
+
+    if info and info.get('_type', 'video') == 'video':
+        if job.audio:
+            selected = select_audio_format(info, job.config.audio_format)
+        else:
+            selected = select_format(info, job.config.width, job.config.height)
+        if selected:
+            ydl_opts.update({'format': selected})
+            for attempt in range(job.config.stall_retries + 1):
+                try:
+                    with downloader(backend, ydl_opts, info) as ydl:
+                        return ydl.process_ie_result(copy.deepcopy(info), download=True)
+                except backend.utils.DownloadError as e:
+                    if is_stall(e) and attempt < job.config.stall_retries:
+                        # .part files are kept, so the next attempt resumes
+                        log.warning('Download stalled ({}), reconnecting.'.format(e))
+                        continue
+                    log.warning('Selected format failed ({}), falling back.'.format(e))
+                    ydl_opts.update(YDL_OPTS_AUDIO if job.audio else YDL_OPTS_BEST_RES)
+                    break
+
+    while True:
+        with downloader(backend, ydl_opts) as ydl:
+            try:
+                return ydl.extract_info(job.source, download=True)
+            except backend.utils.DownloadError as e:
+                if 'not available' in str(e) and ydl_opts['format'] != YDL_OPTS_BEST_RES['format']:
+                    log.warning('Resolution {res} not available, downloading best possible resolution.'.format(res=job.config.res))
+                    ydl_opts.update(YDL_OPTS_BEST_RES)
+                else:
+                    log.error('Download failed: {}'.format(e))
+                    return None
+
+def is_stall(error):
+    '''True for downloader errors caused by a connection that stopped sending.'''
+    message = str(error).lower()
+    return 'timed out' in message or 'timeout' in message
+
+def fetch_captions(job, backend, info):
+    '''Write just the captions for an already downloaded video.'''
+    ydl_opts = ydl_options(job)
+    ydl_opts.update({'skip_download': True})
+    try:
+        with downloader(backend, ydl_opts, info) as ydl:
+            ydl.process_ie_result(copy.deepcopy(info), download=True)
+    except backend.utils.DownloadError as e:
+        log.warning('Could not download captions: {}'.format(e))
+
+@staged('download')
+def download(job):
+    '''Fetch the job's source into its downloading folder and return job.files.
+
+    Local files are copied (with spaces replaced by underscores); anything
+    else is treated as a URL for yt-dlp/youtube-dl.  A local file already
+    done with the same options isn't copied at all: job.duplicate lists the
+    earlier outputs instead.
+    '''
+    make_dirs(job)
+    if job.local:
+        job.duplicate = find_duplicate(job)
+        if job.duplicate:
+            log.info('Already processed with these options: {}'.format(', '.join(job.duplicate)))
+            return job.files
+        new_name = re.sub(' ', '_', os.path.basename(job.source))
+        shutil.copy2(job.source, os.path.join(job.downloading, new_name))
+    else:
+        # ffmpeg merges and range cuts run by yt-dlp itself
+        with children('yt-dlp ffmpeg'):
+            download_video(job)
+    job.files = get_files(job)
+    return job.files
@@ -0,0 +1,310 @@
+'''Encoding (letterbox, captions, trims) and MP4 re-wrapping/smart-cut.'''
+
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+from .accounting import staged
+from .analyze import analyze, channel_filter, crop_filter, needs_normalizing
+from .calibrate import tuned_encoding
+from .captions import convert_captions, prepare_captions
+from .chapters import split_job
+from .download import is_audio_codec
+from .logs import log
+from .probe import (get_audio_codec, get_duration, get_keyframes, get_metadata,
+                    get_resolution, get_video_stream, is_target_resolution, probe)
+from .process import StallError, run, run_with_progress
+from .templates import (AUDIO_OUTPUTS, FFMPEG_AUDIO, FFMPEG_FASTSTART, FFMPEG_MP4_CONTAINER,
+                        FFMPEG_NORM, FFMPEG_PRORES, FFMPEG_PRORES_CAPS,
+                        FFMPEG_PRORES_LETTERBOX, FFMPEG_PRORES_LETTERBOX_CAPS,
+                        FFMPEG_SMARTCUT_COPY, FFMPEG_SMARTCUT_ENCODE, FFMPEG_SMARTCUT_JOIN,
+                        FRAGMENTED_OUTPUT, LETTERBOX_FILTER, SMARTCUT_ENCODERS)
+from .timecode import format_time, parse_time
+
+
+def get_container(config, skip_encoding=False):
+    if 'prores' in config.encoding:
+        if (skip_encoding == True):
+            return '.mp4'
+        return '.mov'
+    elif any(enc in config.encoding for enc in ['vp8', 'vp9']):
+        return '.webm'
+    else:
+        return '.mp4'
+
+@staged('encode')
+def transcode(job):
+    '''Encode video with captions burned in (if present).
+
+    Audio-only jobs skip the video stream entirely and copy the source audio
+    when it already matches -audio-format.
+
+    Trims seek on the input side, so ffmpeg only decodes from the keyframe
+    before the in-point.  Captions are clipped to the trim and shifted back by
+    the in-point plus job.source_offset (where a partial download starts in
+    the original video) ahead of time, see captions.py.
+
+    The sampled analysis (see analyze.py) decides channel mapping for
+    one-sided audio, cropping of baked-in black bars before scaling, and
+    whether normalization is needed at all.
+
+    An encode that stops making progress for -stall-timeout seconds is
+    killed and restarted, up to -stall-retries times.
+
+    -encoding is swapped for the fastest equivalent settings found by
+    -calibrate on this machine, if any.
+
+    With -progressive the encode is written as a fragmented file straight into
+    the download location, so it can be reviewed while it's still encoding,
+    and remuxed into a normal file at the end.
+
+    With -workers set, uncaptioned video is split across the encode workers
+    (see distributed.py), falling back to a local encode if that fails.
+    '''
+    analysis = job.analysis if job.analysis is not None else analyze(job)
+    config = job.config
+    video = job.files['video']
+    captions = job.files['captions']
+    duration = get_duration(job.metadata)
+    is_target_res = is_target_resolution(get_resolution(job.metadata), config)
+    crop = '' if job.audio else crop_filter(analysis)
+    if crop:
+        is_target_res = False
+    channels = channel_filter(analysis, job.monofix)
+    audio_filter = "-af '{}'".format(channels) if channels else ''
+    ext = get_container(config)
+    if job.audio:
+        ext, codecs, _, audio_transcode = AUDIO_OUTPUTS[config.audio_format]
+        copy = is_audio_codec(get_audio_codec(job.metadata), codecs) and not audio_filter
+        audio_codec = 'copy' if copy else audio_transcode
+    start = parse_time(job.inpoint) or 0
+    end = parse_time(job.outpoint)
+    if end is None:
+        end = duration + 1 if duration else 7200
+    length = end - start
+    if captions and not job.audio:
+        captions = prepare_captions(job, start + job.source_offset, length)
+    inpoint, length = format_time(start), format_time(length)
+    new_filename = (job.output_name or os.path.splitext(os.path.basename(video))[0]) + ext
+    outpath = os.path.join(job.encoding_dir, new_filename)
+    encoding = tuned_encoding(config)
+    if encoding != config.encoding and not job.audio:
+        log.info('Using calibrated encoder settings: {}'.format(encoding))
+    settings = dict(inpath=video, startpoint=inpoint, outpath=outpath, length=length,
+                    encoding=encoding, framerate=config.framerate,
+                    crop=crop, audio_filter=audio_filter, output_opts='')
+    if config.workers and not job.audio and captions is None:
+        from .distributed import distributed_encode
+        video_args = ['-an', '-c:v'] + config.encoding.split() + ['-r', str(config.framerate)]
+        if not is_target_res:
+            video_args = ['-vf', crop + LETTERBOX_FILTER.format(width=config.width, height=config.height)] + video_args
+        if distributed_encode(job, video_args, start, min(end, duration or end), outpath, channels):
+            if job.norm and needs_normalizing(analysis):
+                return normalize(outpath)
+            return True
+        log.info('Falling back to a local encode')
+    progressive = config.progressive and not job.audio
+    if progressive:
+        partial = os.path.join(config.download_location, os.path.splitext(new_filename)[0] + '.partial' + ext)
+        log.info('Playable while encoding: {}'.format(partial))
+        settings.update(outpath=partial, output_opts=FRAGMENTED_OUTPUT)
+    if not job.audio:
+        if captions is None and not is_target_res:
+            log.info('Yes Scale/Letterbox, No captions')
+            proc = ' '.join(FFMPEG_PRORES_LETTERBOX).format(width=config.width, height=config.height, **settings)
+        elif captions and not is_target_res:
+            log.info('Yes Scale/Letterbox, Yes captions')
+            proc = ' '.join(FFMPEG_PRORES_LETTERBOX_CAPS).format(subtitles=captions, width=config.width, height=config.height, **settings)
+        elif captions and is_target_res:
+            log.info('No Scale/Letterbox, Yes captions')
+            proc = ' '.join(FFMPEG_PRORES_CAPS).format(subtitles=captions, **settings)
+        else:
+            log.info('No Scale/Letterbox, No captions')
+            proc = ' '.join(FFMPEG_PRORES).format(**settings)
+    else:
+        log.info('Audio only ({})'.format('stream copy' if audio_codec == 'copy' else 'transcode'))
+        proc = ' '.join(FFMPEG_AUDIO).format(audio_codec=audio_codec, **settings)
+
+    success = run_watched(proc, min(end, duration or end) - start, job.output_name or 'Encoding',
+                          config, settings['outpath'])
+    # Normalizing prints nothing while it works, so it runs after the
+    # watched encode rather than chained onto it
+    if success and job.norm and needs_normalizing(analysis):
+        success = normalize(settings['outpath'])
+    if success and progressive:
+        return finish_progressive(partial, outpath)
+    return success
+
+def run_watched(proc, total, desc, config, outpath):
+    '''run_with_progress with -stall-timeout, restarting a stalled ffmpeg up to -stall-retries times.'''
+    for attempt in range(config.stall_retries + 1):
+        try:
+            return run_with_progress(proc, total, desc=desc, stall_timeout=config.stall_timeout)
+        except StallError as e:
+            retry = attempt < config.stall_retries
+            log.warning('Encode stalled ({}), {}'.format(e, 'restarting' if retry else 'giving up'))
+            # Not every template passes -y, so ffmpeg would stop to ask about the old file
+            if os.path.exists(outpath):
+                os.remove(outpath)
+    return False
+
+def normalize(path):
+    '''Normalize the audio of an encoded file in place with ffmpeg-normalize.'''
+    log.info('Normalizing audio')
+    return run(' '.join(FFMPEG_NORM).format(outpath=path).lstrip(' &'))
+
+def finish_progressive(partial, outpath):
+    '''Remux a finished fragmented encode into a normal faststart file (stream copy).
+
+    The partial file is removed once that worked and left in place otherwise,
+    without a half-written final file next to it.
+    '''
+    proc = [arg.format(inpath=partial, outpath=outpath) for arg in FFMPEG_FASTSTART]
+    if not run(proc):
+        log.warning('Could not remux {}, the fragmented file is left as is'.format(partial))
+        if os.path.exists(outpath):
+            os.remove(outpath)
+        return False
+    os.remove(partial)
+    return True
+
+def smart_cut(video_path, metadata, start, end, outpath, workdir, config):
+    '''Frame-accurate trim that re-encodes only the GOPs cut by start/end.
+
+    Every whole GOP inside [start, end) is stream-copied; the partial GOPs at
+    each boundary are re-encoded with the source codec, profile and pixel
+    format so they splice cleanly.  Audio is re-encoded to AAC over the exact
+    range.  Each ffmpeg step runs under the stall watchdog (see
+    run_watched).  Returns False if the source can't be smart-cut.
+    '''
+    stream = get_video_stream(metadata)
+    if not stream.get('pix_fmt'):
+        # Metadata came from the downloader's info dict; profile and pixel
+        # format are needed to match the source, so ask ffprobe after all
+        stream = get_video_stream(get_metadata(video_path))
+    encoder = SMARTCUT_ENCODERS.get(stream.get('codec_name'))
+    if not encoder:
+        return False
+    keyframes = get_keyframes(video_path)
+    inner = [k for k in keyframes if start <= k <= end]
+    if len(inner) < 2:
+        return False
+    gop_in, gop_out = inner[0], inner[-1]
+    try:
+        num, den = stream.get('r_frame_rate', '30/1').split('/')
+        frame = float(den) / float(num)
+    except (ValueError, ZeroDivisionError):
+        frame = 1 / 30.0
+    params = ['-pix_fmt', stream.get('pix_fmt') or 'yuv420p', '-crf', '16', '-preset', 'fast',
+              '-r', stream.get('r_frame_rate', '30/1')]
+    profile = (stream.get('profile') or '').lower().replace('constrained ', '')
+    if encoder == 'libx264' and profile in ('baseline', 'main', 'high', 'high 10', 'high 4:2:2', 'high 4:4:4 predictive'):
+        params = ['-profile:v', profile.split(' ')[0] if profile != 'high 10' else 'high10'] + params
+
+    workdir = os.path.join(workdir, '.smartcut')
+    os.makedirs(workdir, exist_ok=True)
+    pieces = []
+    try:
+        if gop_in - start > frame / 2:
+            pieces.append(('encode', start, gop_in))
+        pieces.append(('copy', gop_in, gop_out))
+        if end - gop_out > frame / 2:
+            pieces.append(('encode', gop_out, end))
+        segments = []
+        for i, (mode, seg_start, seg_end) in enumerate(pieces):
+            segment = os.path.join(workdir, 'segment{:03d}.ts'.format(i))
+            if mode == 'copy':
+                # Seek half a frame past the keyframe and stop a frame short of the
+                # next one so rounding in pts_time can't pull in a neighbouring GOP
+                proc = [arg.format(inpath=video_path, startpoint=format_time(seg_start + frame / 2),
+                                   length=format_time(seg_end - seg_start - frame), outpath=segment)
+                        for arg in FFMPEG_SMARTCUT_COPY]
+            else:
+                proc = []
+                for arg in FFMPEG_SMARTCUT_ENCODE:
+                    if arg == '{params}':
+                        proc.extend(params)
+                        continue
+                    proc.append(arg.format(inpath=video_path, startpoint=format_time(seg_start),
+                                           length=format_time(seg_end - seg_start), encoder=encoder,
+                                           outpath=segment))
+            log.info('Smart cut: {} {} - {}'.format(mode, format_time(seg_start), format_time(seg_end)))
+            if not run_watched(proc, seg_end - seg_start, 'Smart cut ' + mode, config, segment):
+                return False
+            segments.append(segment)
+        listpath = os.path.join(workdir, 'segments.txt')
+        with open(listpath, 'w') as f:
+            for segment in segments:
+                f.write("file '{}'\n".format(segment))
+        proc = [arg.format(listpath=listpath, inpath=video_path, startpoint=format_time(start),
+                           length=format_time(end - start), outpath=outpath)
+                for arg in FFMPEG_SMARTCUT_JOIN]
+        return run_watched(proc, end - start, 'Smart cut join', config, outpath)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+@staged('encode')
+def mp4_container(job):
+    '''Re-wrap video file in mp4 container.
+
+    Trimmed H.264/HEVC sources are smart-cut: whole GOPs are stream-copied and
+    only the boundary GOPs re-encoded.  Anything else will re-encode audio to
+    AAC and video to MPEG4 to conform to mp4.  Stalls are handled as in
+    transcode().
+    '''
+    video_path = job.files['video']
+    duration = get_duration(job.metadata)
+    start = parse_time(job.inpoint) or 0
+    end = parse_time(job.outpoint)
+    trimmed = bool(start or end is not None)
+    if end is None:
+        end = duration if duration else 7200
+    inpoint, length = format_time(start), format_time(end - start + (0 if trimmed else 1))
+
+    vid_name, ext = os.path.splitext(os.path.basename(video_path))
+    if ext == '.mp4' and not trimmed:
+        log.info('Already mp4, no need to re-encode audio for mp4 (-fast)')
+        return True
+    new_filename = vid_name + '.mp4'
+    outpath = os.path.join(job.downloading, new_filename)
+    if outpath == video_path:
+        outpath = os.path.join(job.downloading, vid_name + '_trim.mp4')
+    if trimmed and smart_cut(video_path, job.metadata, start, end, outpath, job.downloading, job.config):
+        log.info('Smart cut complete, no full re-encode needed')
+        os.remove(video_path)
+        return True
+    proc = ' '.join(FFMPEG_MP4_CONTAINER).format(inpath=video_path, startpoint=inpoint, length=length, outpath=outpath)
+    success = run_watched(proc, end - start, job.output_name or 'Converting to MP4', job.config, outpath)
+    os.remove(video_path)
+    return success
+
+def encode(job):
+    '''Encode the job's downloaded video, or re-wrap it as MP4 for -fast/MP4 jobs.
+
+    Probes the video first if probe() hasn't been called.  Chapter jobs are
+    split into one encode per chapter.  Returns True if ffmpeg succeeded.
+    '''
+    if job.metadata is None:
+        probe(job)
+    if job.skip_encoding:
+        return mp4_container(job)
+    if job.chapters:
+        return encode_chapters(job)
+    return transcode(job)
+
+def encode_chapters(job):
+    '''Encode every chapter of the job to its own file, config.chapter_jobs at a time.
+
+    The sampled analysis runs once for the whole video and is shared, and
+    the caption track is converted to ASS once before the chapters start.
+    '''
+    if job.analysis is None:
+        analyze(job)
+    parts = split_job(job)
+    if not parts:
+        return transcode(job)
+    if job.files['captions'] and not job.audio:
+        convert_captions(job)
+    log.info('Encoding {} chapters'.format(len(parts)))
+    with ThreadPoolExecutor(max_workers=job.config.chapter_jobs) as pool:
+        return all(list(pool.map(transcode, parts)))
@@ -0,0 +1,93 @@
+'''Working folders: finding downloaded files and moving finished ones out.'''
+
+import os
+import shutil
+
+from .accounting import summarize
+from .captions import pick_track
+from .fingerprint import record
+from .history import add_job
+from .logs import log, log_file_only
+
+YOUTUBE_CAPTION_FORMATS = set(['.srt', '.sbv', '.sub', '.mpsub', '.lrc', '.cap', '.smi',
+                                '.sami', '.rt', '.vtt', '.ttml', '.dfxp', '.scc', '.stl',
+                                '.tds', '.cin', '.asc'])
+YOUTUBE_VIDEO_FORMATS = set(['.flv', '.3gp', '.mp4', '.webm', '.mkv', '.ogv', '.wmv', '.mpg'])
+YOUTUBE_AUDIO_FORMATS = set(['.m4a', '.opus', '.ogg', '.oga', '.mp3', '.aac', '.wav', '.flac'])
+
+
+def check_path(path):
+    return os.path.exists(path)
+
+def make_dirs(job):
+    '''Create necessary directories'''
+    for folder in [job.config.download_location, job.downloading, job.encoding_dir]:
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+def get_files(job):
+    '''Return dict of filepaths to use for encoding/burning/moving.
+
+    When several caption tracks were downloaded, pick_track() chooses one.
+    '''
+    vid = None
+    caps = []
+    files = os.listdir(job.downloading)
+    for f in files:
+        if f.startswith('.'):
+            continue
+        ext = os.path.splitext(f)[1]
+        if job.local:
+            vid = f
+        else:
+            if ext in YOUTUBE_CAPTION_FORMATS:
+                caps.append(f)
+            elif ext in YOUTUBE_VIDEO_FORMATS or ext in YOUTUBE_AUDIO_FORMATS:
+                vid = f
+    return {'video': os.path.join(job.downloading, vid) if vid else None,
+            'captions': os.path.join(job.downloading, pick_track(caps)) if caps else None}
+
+def move_files(job):
+    '''Move all files from the job's encoding folder to the download location.
+
+    Will overwrite existing file of same name.  Returns the moved file names.
+    '''
+    if job.skip_encoding:
+        src = job.downloading
+    else:
+        src = job.encoding_dir
+    moved = os.listdir(src)
+    for f in moved:
+        shutil.move(os.path.join(src, f), os.path.join(job.config.download_location, f))
+    return moved
+
+def cleanup(job):
+    '''Remove downloads/encodes so we can start another.
+
+    Accepts a Config as well as a Job, to clear the default folders.
+    '''
+    try:
+        shutil.rmtree(job.downloading)
+        shutil.rmtree(job.encoding_dir)
+    except OSError:
+        pass
+
+def finalize(job, success):
+    '''Move the job's output to the download location and remove its working folders.
+
+    success is what encode() returned.  A successful job is recorded in the fingerprint index and the ledger
+    (see history.py); after a failed encode whatever was written is still
+    moved, but the source isn't marked as done.
+    '''
+    video = job.files.get('video')
+    source_bytes = os.path.getsize(video) if video and os.path.exists(video) else None
+    moved = move_files(job)
+    if success and job.fingerprint:
+        record(job, moved)
+    cleanup(job)
+    summarize(job, log if job.config.profile else log_file_only)
+    if not success:
+        log.warning('Encode failed: {}'.format(job.source))
+        return
+    log.info('Finished: {}'.format(job.source))
+    add_job(job, source_bytes, moved)
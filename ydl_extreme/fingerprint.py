@@ -0,0 +1,136 @@
+'''Fast fingerprints of local sources, so re-ingested files aren't encoded twice.
+
+A fingerprint hashes the file size plus a handful of sampled blocks (head,
+tail and SAMPLE_BLOCKS evenly spaced in between) read through mmap, so a
+100 GB file costs a few MB of reads.  xxhash is used when it's installed,
+blake2b otherwise; the algorithm is part of the key so indexes never mix them.
+
+Finished local jobs are recorded in an index in the download location,
+keyed by fingerprint and the options that shape the output.  With
+-verify-duplicates a sampled match is only trusted after a full hash of
+both files agrees.
+'''
+
+import hashlib
+import json
+import mmap
+import os
+import threading
+
+from .logs import log
+
+INDEX_FILE = '.fingerprints.json'
+BLOCK_SIZE = 256 * 1024
+SAMPLE_BLOCKS = 8
+FULL_HASH_SLICE = 16 * 1024 * 1024
+
+_index_lock = threading.Lock()
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+def new_hasher():
+    '''Return (name, hasher): xxh3_128 if available, else blake2b.'''
+    if xxhash is not None:
+        return 'xxh3', xxhash.xxh3_128()
+    return 'blake2b', hashlib.blake2b(digest_size=16)
+
+def sample_offsets(size, block_size=BLOCK_SIZE, blocks=SAMPLE_BLOCKS):
+    '''Offsets of the head, middle and tail blocks, or [0] if the file is small.'''
+    if size <= block_size * (blocks + 2):
+        return [0]
+    step = (size - block_size) // (blocks + 1)
+    return [step * i for i in range(blocks + 2)][:-1] + [size - block_size]
+
+def read_blocks(path, offsets, length):
+    '''Feed [offset, offset + length) slices of path to a new hasher.'''
+    name, hasher = new_hasher()
+    size = os.path.getsize(path)
+    hasher.update(str(size).encode('ascii'))
+    if size:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            for offset in offsets:
+                hasher.update(m[offset:offset + length])
+    return '{}:{}:{}'.format(name, size, hasher.hexdigest())
+
+def fingerprint(path):
+    '''Sampled fingerprint of path: algorithm, size and hash of the sampled blocks.'''
+    size = os.path.getsize(path)
+    offsets = sample_offsets(size)
+    return read_blocks(path, offsets, BLOCK_SIZE if len(offsets) > 1 else size)
+
+def full_hash(path):
+    '''Hash of the whole file, for confirming a sampled match.'''
+    size = os.path.getsize(path)
+    return read_blocks(path, range(0, size, FULL_HASH_SLICE), FULL_HASH_SLICE)
+
+def options_key(job):
+    '''The job settings that change what gets written for a source.'''
+    config = job.config
+    if job.skip_encoding:
+        output = ['mp4']
+    elif job.audio:
+        output = ['audio', config.audio_format]
+    else:
+        output = [config.encoding, str(config.framerate), str(config.res)]
+    return '|'.join(output + [job.inpoint or '', job.outpoint or '',
+                              str(bool(job.norm)), str(bool(job.monofix))] +
+                    (['chapters'] if job.chapters else []))
+
+def index_path(config):
+    return os.path.join(config.download_location, INDEX_FILE)
+
+def load_index(config):
+    try:
+        with open(index_path(config)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_index(config, index):
+    path = index_path(config)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp, path)
+
+def find_duplicate(job):
+    '''Fingerprint a local job's source and look it up in the index.
+
+    Sets job.fingerprint.  Returns the outputs of an earlier job with the
+    same source and options if they are all still in the download location,
+    otherwise None.
+    '''
+    config = job.config
+    job.fingerprint = fingerprint(job.source)
+    with _index_lock:
+        entry = load_index(config).get(job.fingerprint + '|' + options_key(job))
+    if not entry:
+        return None
+    outputs = [os.path.join(config.download_location, f) for f in entry['outputs']]
+    if not outputs or not all(os.path.exists(f) for f in outputs):
+        return None
+    if config.verify_duplicates:
+        previous = entry.get('full_hash')
+        if previous is None and os.path.exists(entry['source']):
+            previous = full_hash(entry['source'])
+        if previous is None or previous != full_hash(job.source):
+            log.info('Sampled fingerprint matched {} but full hash did not'.format(entry['source']))
+            return None
+    return outputs
+
+def record(job, outputs):
+    '''Remember a finished local job's outputs (names in the download location).'''
+    config = job.config
+    if not outputs:
+        return
+    entry = {'source': os.path.abspath(job.source), 'outputs': outputs}
+    if config.verify_duplicates:
+        entry['full_hash'] = full_hash(job.source)
+    with _index_lock:
+        index = load_index(config)
+        index[job.fingerprint + '|' + options_key(job)] = entry
+        save_index(config, index)
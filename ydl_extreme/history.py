@@ -0,0 +1,233 @@
+'''Job ledger: every finished job in a sqlite database, and queries over it.
+
+finalize() adds a row per job to LEDGER_FILE in the download location:
+the source and its video ID (extractor:id, for downloads) or fingerprint
+(for local files), the downloaded format, the output settings, the stage
+timings, source and output sizes and where the output went.  The ledger
+is indexed by video ID, fingerprint and finish time, so the history
+commands answer without scanning ydli.log:
+
+    python -m ydl_extreme.history find URL_OR_FILE
+    python -m ydl_extreme.history speed --days 7 --encoding prores --res 2160
+    python -m ydl_extreme.history largest -n 10
+    python -m ydl_extreme.history recent
+
+The realtime factor is seconds of output per second of encoding.
+'''
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import time
+
+from .accounting import totals
+from .config import DOWNLOAD_LOCATION
+from .fingerprint import fingerprint
+from .logs import log_file_only
+from .probe import get_duration
+from .timecode import parse_time
+from .urls import video_key
+
+LEDGER_FILE = '.ledger.db'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    started REAL,
+    finished REAL NOT NULL,
+    source TEXT NOT NULL,
+    video_id TEXT,
+    fingerprint TEXT,
+    format TEXT,
+    mode TEXT,
+    encoding TEXT,
+    res INTEGER,
+    framerate REAL,
+    inpoint TEXT,
+    outpoint TEXT,
+    duration REAL,
+    download_seconds REAL,
+    encode_seconds REAL,
+    realtime REAL,
+    source_bytes INTEGER,
+    output_bytes INTEGER,
+    outputs TEXT,
+    usage TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_video_id ON jobs (video_id);
+CREATE INDEX IF NOT EXISTS jobs_fingerprint ON jobs (fingerprint);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished);
+'''
+
+
+def ledger_path(download_location):
+    return os.path.join(download_location, LEDGER_FILE)
+
+def connect(download_location):
+    conn = sqlite3.connect(ledger_path(download_location), timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+def video_id(job):
+    '''extractor:id of a downloaded job: its canonical ID, else the one in its info dict.'''
+    info = job.info or {}
+    if job.video_id or not info.get('id'):
+        return job.video_id
+    return '{}:{}'.format((info.get('extractor_key') or info.get('extractor') or 'generic').lower(), info['id'])
+
+def output_mode(job):
+    if job.skip_encoding:
+        return 'mp4'
+    return 'audio' if job.audio else 'encode'
+
+def output_duration(job):
+    '''Seconds of output: the trimmed length of the downloaded file.'''
+    if not job.metadata:
+        return None
+    end = parse_time(job.outpoint)
+    if end is None:
+        end = get_duration(job.metadata)
+    return end - (parse_time(job.inpoint) or 0)
+
+def span_seconds(job, name):
+    span = job.stages.get(name)
+    return span[1] - span[0] if span else None
+
+def add_job(job, source_bytes, outputs):
+    '''Add a finished job with its outputs (names in the download location) to the ledger.'''
+    config = job.config
+    location = config.download_location
+    duration = output_duration(job)
+    encode_seconds = span_seconds(job, 'encode')
+    starts = [span[0] for span in job.stages.values()]
+    row = {
+        'started': min(starts) if starts else None,
+        'finished': time.time(),
+        'source': os.path.abspath(job.source) if job.local else job.source,
+        'video_id': video_id(job),
+        'fingerprint': job.fingerprint,
+        'format': (job.info or {}).get('format_id'),
+        'mode': output_mode(job),
+        'encoding': None if job.skip_encoding else (config.audio_format if job.audio else config.encoding),
+        'res': config.res,
+        'framerate': config.framerate,
+        'inpoint': job.inpoint or None,
+        'outpoint': job.outpoint or None,
+        'duration': duration,
+        'download_seconds': span_seconds(job, 'download'),
+        'encode_seconds': encode_seconds,
+        'realtime': duration / encode_seconds if duration and encode_seconds else None,
+        'source_bytes': source_bytes,
+        'output_bytes': sum(os.path.getsize(os.path.join(location, f)) for f in outputs
+                            if os.path.exists(os.path.join(location, f))),
+        'outputs': json.dumps(outputs),
+        'usage': json.dumps(totals(job.usage)),
+    }
+    try:
+        conn = connect(location)
+        try:
+            with conn:
+                conn.execute('INSERT INTO jobs ({}) VALUES ({})'.format(
+                    ', '.join(row), ', '.join('?' * len(row))), list(row.values()))
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        log_file_only.warning('Could not record job in the ledger: {}'.format(e))
+
+
+def find(conn, source):
+    '''Rows for a URL (in any form of it), extractor:id, local file or bare video ID.'''
+    if os.path.exists(source):
+        return conn.execute('SELECT * FROM jobs WHERE fingerprint = ? ORDER BY finished DESC',
+                            (fingerprint(source),)).fetchall()
+    key = video_key(source)
+    if key:
+        return conn.execute('SELECT * FROM jobs WHERE video_id = ? ORDER BY finished DESC', (key,)).fetchall()
+    return conn.execute('SELECT * FROM jobs WHERE video_id = ? OR source = ? OR video_id LIKE ? '
+                        'ORDER BY finished DESC', (source, source, '%:' + source)).fetchall()
+
+def speed(conn, days=None, encoding=None, res=None):
+    '''Average realtime factor per encoding and resolution.'''
+    where, params = ['realtime IS NOT NULL'], []
+    if days:
+        where.append('finished >= ?')
+        params.append(time.time() - days * 86400)
+    if encoding:
+        where.append('encoding LIKE ?')
+        params.append('%{}%'.format(encoding))
+    if res:
+        where.append('res = ?')
+        params.append(res)
+    return conn.execute('SELECT encoding, res, COUNT(*) AS jobs, AVG(realtime) AS realtime, '
+                        'SUM(duration) AS duration FROM jobs WHERE {} GROUP BY encoding, res '
+                        'ORDER BY jobs DESC'.format(' AND '.join(where)), params).fetchall()
+
+def largest(conn, n=10):
+    return conn.execute('SELECT * FROM jobs ORDER BY COALESCE(output_bytes, 0) + COALESCE(source_bytes, 0) DESC '
+                        'LIMIT ?', (n,)).fetchall()
+
+def recent(conn, n=20):
+    return conn.execute('SELECT * FROM jobs ORDER BY finished DESC LIMIT ?', (n,)).fetchall()
+
+
+def format_bytes(n):
+    n = float(n or 0)
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if n < 1024:
+            return '{:.1f} {}'.format(n, unit)
+        n /= 1024
+    return '{:.1f} TB'.format(n)
+
+def format_job(row):
+    when = time.strftime('%Y-%m-%d %H:%M', time.localtime(row['finished']))
+    realtime = '{:.2f}x'.format(row['realtime']) if row['realtime'] else '-'
+    return '{}  {:<6} {:>10} {:>7}  {}  -> {}'.format(
+        when, row['mode'], format_bytes(row['output_bytes']), realtime,
+        row['video_id'] or row['source'], ', '.join(json.loads(row['outputs'] or '[]')))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m ydl_extreme.history')
+    parser.add_argument('--download-location', default=DOWNLOAD_LOCATION,
+                        help='folder holding the ledger (default: %(default)s)')
+    sub = parser.add_subparsers(dest='command')
+    find_cmd = sub.add_parser('find', help='have we already got this URL, video ID or file?')
+    find_cmd.add_argument('source')
+    speed_cmd = sub.add_parser('speed', help='average realtime factor per encoding and resolution')
+    speed_cmd.add_argument('--days', type=float)
+    speed_cmd.add_argument('--encoding')
+    speed_cmd.add_argument('--res', type=int)
+    for name, default, help in [('largest', 10, 'largest jobs by bytes'), ('recent', 20, 'latest jobs')]:
+        cmd = sub.add_parser(name, help=help)
+        cmd.add_argument('-n', type=int, default=default)
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+    if args.command is None:
+        parser.print_help()
+        return
+    location = os.path.expanduser(args.download_location)
+    if not os.path.exists(ledger_path(location)):
+        print('No ledger in {}'.format(location))
+        return
+    conn = connect(location)
+    try:
+        if args.command == 'speed':
+            rows = speed(conn, args.days, args.encoding, args.res)
+            for row in rows:
+                print('{:<40} {:>5}p {:4d} jobs {:8.2f}x realtime  {:9.0f}s of output'.format(
+                    row['encoding'] or '-', row['res'], row['jobs'], row['realtime'], row['duration'] or 0))
+        else:
+            if args.command == 'find':
+                rows = find(conn, args.source)
+            else:
+                rows = largest(conn, args.n) if args.command == 'largest' else recent(conn, args.n)
+            for row in rows:
+                print(format_job(row))
+        if not rows:
+            print('No matching jobs')
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    main()
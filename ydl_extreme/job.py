@@ -0,0 +1,74 @@
+'''The Job object passed through download(), probe(), encode() and finalize().'''
+
+import os
+
+from .urls import video_key
+
+
+class Job(object):
+    '''One YouTube link or local file, plus the answers to the prompts.
+
+    inpoint/outpoint are hh:mm:ss strings as typed by the user (blank or
+    None for no trim).  The pipeline stores what it learns back on the job:
+    files found after download, the yt-dlp info dict of the downloaded
+    format, ffprobe-style metadata, the sampled analysis, and
+    source_offset/download_range (where a partial download starts and ends
+    in the original video).  Local sources also get a fingerprint, and
+    duplicate lists earlier outputs if the same file was already done.
+    usage collects the resource usage of every external process run for
+    the job, and stages the wall-clock [start, end] of each stage (see
+    accounting.py).  Finished jobs are recorded in the ledger (history.py).
+    progress_hooks are extra downloader progress hooks (see benchmark.py).
+    video_id is the extractor:id of a URL source (see urls.py), the key
+    it is known by in the ledger and caches.
+
+    chapters=True encodes one file per chapter; each chapter is a copy of
+    the job with its own trim and output_name (see chapters.py).
+
+    One-sided audio is detected automatically; monofix=True additionally
+    sums both channels into each side for sources the analysis misses.
+
+    Each job works in its own downloading/encoding folders, which default
+    to the ones in config.
+    '''
+
+    def __init__(self, source, config, inpoint=None, outpoint=None, monofix=False,
+                 norm=False, audio=False, mp4=False, captions=False, auto_captions=False,
+                 legacy=False, chapters=False, downloading=None, encoding_dir=None):
+        self.source = source
+        self.config = config
+        self.local = os.path.exists(source)
+        self.video_id = None if self.local else video_key(source)
+        self.inpoint = inpoint
+        self.outpoint = outpoint
+        self.monofix = monofix
+        self.norm = norm
+        self.audio = audio
+        self.mp4 = mp4
+        self.captions = captions
+        self.auto_captions = auto_captions
+        self.legacy = legacy
+        self.chapters = chapters
+        self.output_name = None
+        self.downloading = downloading or config.downloading
+        self.encoding_dir = encoding_dir or config.encoding_dir
+        self.source_offset = 0
+        self.download_range = None
+        self.info = None
+        self.files = {'video': None, 'captions': None}
+        self.metadata = None
+        self.analysis = None
+        self.prefetch = None
+        self.fingerprint = None
+        self.duplicate = None
+        self.usage = []
+        self.stages = {}
+        self.progress_hooks = []
+
+    @property
+    def skip_encoding(self):
+        '''True for -fast runs and jobs that asked for plain MP4 output.'''
+        return self.config.skip_encoding or self.mp4
+
+    def __repr__(self):
+        return 'Job({!r})'.format(self.source)
@@ -0,0 +1,25 @@
+'''Loggers shared by the ydl_extreme modules.
+
+log goes to the console and ydli.log; log_file_only (subprocess calls and
+their output) only goes to ydli.log.  No handlers are attached until
+setup_logging() is called, so library users keep control of logging.
+'''
+
+import logging
+
+FORMAT = logging.Formatter('%(asctime)s :: %(levelname)s :: %(message)s',
+                           datefmt='%Y-%m-%d %H:%M:%S')
+log = logging.getLogger('ydl_extreme')
+log_file_only = logging.getLogger('ydl_extreme_file')
+
+
+def setup_logging(path):
+    '''Attach the console handler and the ydli.log file handler.'''
+    log.setLevel(logging.DEBUG)
+    log_file_only.setLevel(logging.DEBUG)
+    fh = logging.FileHandler(path)
+    fh.setFormatter(FORMAT)
+    ch = logging.StreamHandler()
+    log.addHandler(fh)
+    log.addHandler(ch)
+    log_file_only.addHandler(fh)
@@ -0,0 +1,105 @@
+'''Speculative extraction and download while the user answers prompts.'''
+
+import copy
+import os
+import shutil
+import threading
+
+from .download import get_backend, select_format, ydl_options
+from .files import make_dirs
+from .logs import log_file_only
+from .session import downloader, extract_info
+from .space import estimate_download_size, fits
+from .timecode import get_trim_range
+
+
+class PrefetchCancelled(Exception):
+    pass
+
+
+class Prefetch(object):
+    '''Extract a URL and download the default format in a background thread.
+
+    Started as soon as the URL is entered; the prompts that follow often
+    take longer than the download.  Once they are answered, plan() decides
+    whether the download still fits the job (no audio-only, legacy or
+    unfinished trimmed jobs).  If not, it is cancelled from its progress hook
+    and its partial files removed, but the extracted info is kept so the
+    real download doesn't extract again.  Nothing is downloaded if the
+    estimated size doesn't fit in the downloading folder (see space.py).
+    '''
+
+    def __init__(self, job):
+        self.job = job
+        self.info = None
+        self.result = None
+        self.finished = False
+        self.extracted = threading.Event()
+        self.cancelled = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='prefetch', daemon=True)
+
+    def start(self):
+        make_dirs(self.job)
+        self.thread.start()
+        return self
+
+    def hook(self, status):
+        if self.cancelled.is_set():
+            raise PrefetchCancelled('prefetch cancelled')
+
+    def run(self):
+        backend = get_backend(False)
+        ydl_opts = ydl_options(self.job)
+        # Stay off the console while the user is typing answers
+        ydl_opts.update({'logger': log_file_only, 'quiet': True, 'noprogress': True,
+                         'progress_hooks': ydl_opts.get('progress_hooks', []) + [self.hook]})
+        try:
+            try:
+                self.info = extract_info(backend, self.job.source)
+            finally:
+                self.extracted.set()
+            if not self.info or self.info.get('_type', 'video') != 'video' or self.cancelled.is_set():
+                return
+            selected = select_format(self.info, self.job.config.width, self.job.config.height,
+                                     logger=log_file_only)
+            if not selected:
+                return
+            size = estimate_download_size(self.job, self.info)
+            if size and not fits(self.job.downloading, size, logger=log_file_only):
+                return
+            ydl_opts.update({'format': selected})
+            with downloader(backend, ydl_opts, self.info) as ydl:
+                self.result = ydl.process_ie_result(copy.deepcopy(self.info), download=True)
+            self.finished = True
+        except Exception as e:
+            # Anything going wrong here just means the real download does the work
+            log_file_only.info('Prefetch stopped: {}'.format(e))
+
+    def wait_for_info(self, timeout=None):
+        '''The extracted info once extraction is done (None if it failed or timed out).'''
+        self.extracted.wait(timeout)
+        return self.info
+
+    def plan(self, job):
+        '''Return True if the prefetched download can be used for the answered job.
+
+        Otherwise cancel it and clear its files; self.info stays available.
+        '''
+        trimmed = get_trim_range(job.inpoint, job.outpoint) is not None
+        if not (job.legacy or job.audio or (trimmed and not self.finished)):
+            self.thread.join()
+            if self.finished:
+                return True
+        self.cancel()
+        return False
+
+    def cancel(self):
+        self.cancelled.set()
+        self.thread.join()
+        log_file_only.info('Prefetch discarded for {}'.format(self.job.source))
+        for f in os.listdir(self.job.downloading):
+            path = os.path.join(self.job.downloading, f)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
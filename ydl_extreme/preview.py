@@ -0,0 +1,145 @@
+'''Keyframe thumbnail sheets for picking trim points before the encode.
+
+PREVIEW_FRAMES points evenly spaced over the source are grabbed in
+parallel, each with input seeking and -skip_frame nokey so ffmpeg decodes
+a single keyframe per thumbnail however long the file is, then tiled into
+one sheet.  For a URL the grabs read the smallest progressive video format
+straight from the site (the prefetch's extracted info), so the preview
+doesn't wait for the download.
+
+Sheets are cached in the download location per source fingerprint (per
+extractor:id for URLs, see urls.py), next to the list of thumbnail times.
+'''
+
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from .download import codec_cost
+from .fingerprint import fingerprint
+from .logs import log
+from .probe import get_duration, get_metadata
+from .process import run
+from .templates import FFMPEG_CONTACT_SHEET, FFMPEG_THUMBNAIL
+from .timecode import format_time
+from .urls import video_key
+
+CACHE_DIR = '.previews'
+PREVIEW_FRAMES = 24
+PREVIEW_COLUMNS = 6
+THUMB_WIDTH = 320
+# Seconds to wait for the prefetch to finish extracting a URL
+EXTRACT_TIMEOUT = 20
+
+
+def preview_times(duration, frames=PREVIEW_FRAMES):
+    '''Evenly spaced points, each in the middle of its share of the duration.'''
+    return [duration * (i + 0.5) / frames for i in range(frames)]
+
+def stream_format(info):
+    '''The smallest directly readable video format of an extracted info dict, or None.'''
+    formats = [f for f in info.get('formats') or []
+               if f.get('url') and f.get('vcodec') not in (None, 'none') and f.get('height')
+               and f.get('protocol', 'https') in ('http', 'https')]
+    if not formats:
+        return None
+    return min(formats, key=lambda f: (f['height'] < 144, codec_cost(f.get('vcodec')), f['height']))
+
+def grab(inpath, seconds, outpath, headers=''):
+    proc = []
+    for arg in FFMPEG_THUMBNAIL:
+        if arg == '{headers}':
+            if headers:
+                proc.extend(['-headers', headers])
+            continue
+        proc.append(arg.format(startpoint=format_time(seconds), inpath=inpath,
+                               width=THUMB_WIDTH, outpath=outpath))
+    return run(proc)
+
+def build_sheet(inpath, duration, outpath, headers=''):
+    '''Grab the thumbnails in parallel and tile them; returns the times shown, in order.'''
+    workdir = tempfile.mkdtemp(prefix='ydl_preview_')
+    try:
+        times = preview_times(duration)
+        paths = [os.path.join(workdir, 'grab{:02d}.jpg'.format(i)) for i in range(len(times))]
+        with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as pool:
+            grabbed = list(pool.map(lambda a: grab(inpath, a[0], a[1], headers), zip(times, paths)))
+        # Number the thumbnails that worked consecutively for the image2 demuxer
+        shown = []
+        for ok, seconds, path in zip(grabbed, times, paths):
+            if ok and os.path.exists(path):
+                os.rename(path, os.path.join(workdir, '{:02d}.jpg'.format(len(shown))))
+                shown.append(seconds)
+        if not shown:
+            return None
+        rows = (len(shown) + PREVIEW_COLUMNS - 1) // PREVIEW_COLUMNS
+        proc = [arg.format(inpattern=os.path.join(workdir, '%02d.jpg'), columns=PREVIEW_COLUMNS,
+                           rows=rows, outpath=outpath) for arg in FFMPEG_CONTACT_SHEET]
+        return shown if run(proc) else None
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def cache_paths(config, key):
+    folder = os.path.join(config.download_location, CACHE_DIR)
+    if not os.path.exists(folder):
+        os.makedirs(folder)
+    stem = re.sub(r'[^\w\-]+', '_', key)
+    return os.path.join(folder, stem + '.jpg'), os.path.join(folder, stem + '.json')
+
+def open_image(path):
+    '''Show the sheet in the system image viewer.'''
+    try:
+        if sys.platform == 'win32':
+            os.startfile(path)
+        else:
+            subprocess.Popen(['open' if sys.platform == 'darwin' else 'xdg-open', path],
+                             stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    except OSError:
+        pass
+
+def show_times(times):
+    for row in range(0, len(times), PREVIEW_COLUMNS):
+        log.info('  ' + '  '.join('{:>2}: {}'.format(i + 1, format_time(t).split('.')[0])
+                                  for i, t in enumerate(times[row:row + PREVIEW_COLUMNS], row)))
+
+def preview(source, config, info=None):
+    '''Build (or reuse) the thumbnail sheet for a local file or an extracted URL and show it.
+
+    Returns the sheet's path, or None if there is nothing to preview.
+    '''
+    if info is None:
+        key, inpath, headers = fingerprint(source), source, ''
+        duration = get_duration(get_metadata(source))
+    else:
+        fmt = stream_format(info)
+        if fmt is None or not info.get('id'):
+            log.warning('No preview available for this video')
+            return None
+        key = video_key(source) or '{}:{}'.format((info.get('extractor_key') or 'generic').lower(), info['id'])
+        inpath, duration = fmt['url'], info.get('duration')
+        headers = ''.join('{}: {}\r\n'.format(k, v) for k, v in (fmt.get('http_headers') or {}).items())
+    if not duration:
+        log.warning('No preview available: unknown duration')
+        return None
+    sheet, index = cache_paths(config, key)
+    if os.path.exists(sheet) and os.path.exists(index):
+        with open(index) as f:
+            times = json.load(f)
+    else:
+        log.info('Building preview...')
+        times = build_sheet(inpath, duration, sheet, headers)
+        if not times:
+            log.warning('Could not build a preview')
+            return None
+        with open(index, 'w') as f:
+            json.dump(times, f)
+    log.info('Preview: {} (left to right, top to bottom; each thumbnail is the '
+             'keyframe at or just before its time)'.format(sheet))
+    show_times(times)
+    open_image(sheet)
+    return sheet
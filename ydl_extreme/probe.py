@@ -0,0 +1,134 @@
+'''Reading media metadata with ffprobe.'''
+
+import json
+
+from .accounting import staged
+from .logs import log_file_only
+from .process import capture
+
+# yt-dlp codec strings (RFC 6381 style) to ffprobe codec_name
+INFO_CODECS = [('avc', 'h264'), ('h264', 'h264'), ('hev1', 'hevc'), ('hvc1', 'hevc'),
+               ('vp09', 'vp9'), ('vp9', 'vp9'), ('vp8', 'vp8'), ('av01', 'av1'),
+               ('mp4a', 'aac'), ('aac', 'aac'), ('opus', 'opus'), ('vorbis', 'vorbis'),
+               ('mp3', 'mp3'), ('flac', 'flac')]
+
+
+def get_metadata(video_path):
+    '''Get video metadata using ffprobe'''
+    proc = ['ffprobe',
+            '-v', 'quiet',
+            '-print_format', 'json',
+            '-show_format',
+            '-show_streams',
+            video_path]
+    metadata = json.loads(capture(proc) or '{}')
+    return metadata
+
+def get_resolution(metadata):
+    streams = metadata.get('streams')
+    if not streams:
+        return
+    for stream in streams:
+        if not stream.get('codec_type') == 'video':
+            continue
+        if stream.get('width') and stream.get('height'):
+            width = int(stream['width'])
+            height = int(stream['height'])
+            return (width, height)
+
+def get_video_stream(metadata):
+    for stream in metadata.get('streams') or []:
+        if stream.get('codec_type') == 'video':
+            return stream
+    return {}
+
+def get_audio_codec(metadata):
+    for stream in metadata.get('streams') or []:
+        if stream.get('codec_type') == 'audio':
+            return stream.get('codec_name')
+
+def get_duration(metadata):
+    if metadata.get('format') and metadata['format'].get('duration'):
+        duration = metadata['format']['duration']
+        return float(duration)
+
+def is_target_resolution(resolution, config):
+    '''Check if resolution is the same as the configured (width, height)'''
+    if not resolution:
+        return False
+    if (resolution[0], resolution[1]) != (config.width, config.height):
+        return False
+    return True
+
+def get_keyframes(video_path):
+    '''Return sorted keyframe timestamps of the first video stream.
+
+    Reads packet flags only, so nothing is decoded.
+    '''
+    proc = ['ffprobe',
+            '-v', 'quiet',
+            '-select_streams', 'v:0',
+            '-show_entries', 'packet=pts_time,flags',
+            '-of', 'csv=print_section=0',
+            video_path]
+    keyframes = []
+    for line in capture(proc).splitlines():
+        pts, _, flags = line.partition(',')
+        if 'K' in flags and pts not in ('', 'N/A'):
+            keyframes.append(float(pts))
+    return sorted(keyframes)
+
+def info_codec(codec):
+    codec = (codec or '').lower()
+    for prefix, name in INFO_CODECS:
+        if codec.startswith(prefix):
+            return name
+    return codec.split('.')[0]
+
+def metadata_from_info(info, download_range=None):
+    '''Build ffprobe-style metadata from a yt-dlp info dict.
+
+    Only the fields the getters above read are filled in.  Returns None if
+    the info dict lacks the duration, the codecs, or the size of a video
+    stream.
+    '''
+    if not info:
+        return None
+    formats = info.get('requested_formats') or [info]
+    video = next((f for f in formats if f.get('vcodec') not in (None, 'none')), None)
+    audio = next((f for f in formats if f.get('acodec') not in (None, 'none')), None)
+    duration = info.get('duration')
+    if not duration or not (video or audio):
+        return None
+    if video and not (video.get('width') and video.get('height')):
+        return None
+    if download_range:
+        start, end = download_range
+        duration = min(end, duration) - start
+    streams = []
+    if video:
+        fps = video.get('fps')
+        streams.append({'codec_type': 'video',
+                        'codec_name': info_codec(video.get('vcodec')),
+                        'width': video['width'],
+                        'height': video['height'],
+                        'r_frame_rate': '{}/1000'.format(int(fps * 1000)) if fps else None})
+    if audio:
+        streams.append({'codec_type': 'audio',
+                        'codec_name': info_codec(audio.get('acodec'))})
+    return {'format': {'duration': duration}, 'streams': streams}
+
+@staged('probe')
+def probe(job):
+    '''Read metadata for the job's downloaded video and store it on the job.
+
+    Uses the downloader's info dict when it has everything needed, and only
+    runs ffprobe for local files or incomplete info.
+    '''
+    metadata = metadata_from_info(job.info, job.download_range)
+    if metadata:
+        log_file_only.info('Using downloader info instead of ffprobe: {}'.format(metadata))
+    else:
+        metadata = get_metadata(job.files['video'])
+    job.metadata = metadata
+    return job.metadata
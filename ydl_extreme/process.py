@@ -0,0 +1,167 @@
+'''Running ffmpeg/ffprobe/ffmpeg-normalize subprocesses.
+
+Every external process goes through here so calls are logged to ydli.log
+in one place, and reaped by finish() so their resource usage is recorded
+(see accounting.py).  proc may be an argument list or, for the templates
+that chain commands with &&, a shell string.
+'''
+
+import datetime
+import os
+import queue
+import re
+import signal
+import subprocess
+import threading
+import time
+
+from .accounting import record
+from .logs import log_file_only
+
+# A stall limit is at least this many times the longest gap between progress
+# updates seen so far, so slow encodes that report sparsely aren't killed
+STALL_FACTOR = 4
+
+
+class StallError(Exception):
+    '''Raised when a process stopped making progress and was killed.'''
+
+
+def popen(proc, **kwargs):
+    log_file_only.info('subprocess call: {}'.format(proc))
+    p = subprocess.Popen(proc, shell=isinstance(proc, str), **kwargs)
+    p.proc, p.started = proc, time.monotonic()
+    return p
+
+def finish(p):
+    '''Wait for p (after its output has been read) and record its resource usage.
+
+    Uses os.wait4 where available; elsewhere only wall time and exit status
+    are recorded.  Returns the exit status.
+    '''
+    usage = None
+    if hasattr(os, 'wait4') and p.returncode is None:
+        try:
+            _, status, usage = os.wait4(p.pid, 0)
+            p.returncode = os.waitstatus_to_exitcode(status)
+        except ChildProcessError:
+            usage = None
+    p.wait()
+    record(p.proc, p.returncode, usage, time.monotonic() - p.started)
+    return p.returncode
+
+def read_all(p):
+    text = p.stdout.read()
+    p.stdout.close()
+    finish(p)
+    return text
+
+def capture(proc):
+    '''Run proc and return its stdout as text.'''
+    p = popen(proc, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True)
+    return read_all(p)
+
+def output(proc):
+    '''Run proc and return its stdout and stderr together as text.'''
+    p = popen(proc, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+    return read_all(p)
+
+def run(proc):
+    '''Run proc quietly, logging its output only if it fails.  Returns True on success.'''
+    p = popen(proc, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+    output = read_all(p)
+    if p.returncode:
+        log_file_only.info(output)
+    return p.returncode == 0
+
+def read_lines(stream, lines):
+    for line in iter(stream.readline, ''):
+        lines.put(line)
+    lines.put(None)
+
+def kill(p):
+    '''Kill p and, on POSIX, everything in its session (the && chains run under a shell).'''
+    try:
+        if os.name == 'posix':
+            os.killpg(p.pid, signal.SIGKILL)
+        else:
+            p.kill()
+    except OSError:
+        pass
+    finish(p)
+
+def run_with_progress(proc, total, desc='Encoding', stall_timeout=None):
+    '''Run an ffmpeg command, showing its time= progress against total seconds.
+
+    With stall_timeout, the process is killed and StallError raised once it
+    goes that long (or STALL_FACTOR times its longest gap so far, if more)
+    without time= advancing or printing anything else.
+    '''
+    from tqdm import tqdm
+    p = popen(proc, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True,
+              start_new_session=os.name == 'posix')
+    lines = queue.Queue()
+    threading.Thread(target=read_lines, args=(p.stdout, lines), daemon=True).start()
+    last_progress = time.monotonic()
+    longest_gap = 0
+
+    seconds_encoded = float()
+    try:
+        with tqdm(total=total, desc=desc) as pbar:
+            while True:
+                try:
+                    line = lines.get(timeout=1)
+                except queue.Empty:
+                    line = ''
+                if line is None:
+                    break
+                now = time.monotonic()
+                if line and 'time=' not in line:
+                    last_progress = now
+                if stall_timeout and now - last_progress > max(stall_timeout, STALL_FACTOR * longest_gap):
+                    kill(p)
+                    raise StallError('no progress for {:.0f}s at {:.1f}s of {:.1f}s'.format(
+                        now - last_progress, seconds_encoded, total))
+                if not line:
+                    continue
+                log_file_only.info(line.rstrip())
+                seconds = parse_progress(line)
+                if seconds is not None and seconds > seconds_encoded:
+                    longest_gap = max(longest_gap, now - last_progress)
+                    last_progress = now
+                    pbar.update(seconds - seconds_encoded)
+                    seconds_encoded = seconds
+    except BaseException:
+        if p.poll() is None:
+            kill(p)
+        raise
+    finish(p)
+    return p.returncode == 0
+
+def parse_progress(line):
+    '''Seconds from the time= field of an ffmpeg progress line, or None.'''
+    re1='.*?'	# Non-greedy match on filler
+    re2='(time)'	# Word 1
+    re3='(=)'	# Any Single Character 1
+    re4='(\\d+)'	# Integer Number 1
+    re5='(:)'	# Any Single Character 2
+    re6='(\\d+)'	# Integer Number 2
+    re7='(:)'	# Any Single Character 3
+    re8='(\\d+)'	# Integer Number 3
+    re9='(\\.)'	# Any Single Character 4
+    re10='(\\d+)'	# Integer Number 4
+
+    rg = re.compile(re1+re2+re3+re4+re5+re6+re7+re8+re9+re10,re.IGNORECASE|re.DOTALL)
+    m = rg.search(line)
+    if m:
+        int1=m.group(3)
+        c2=m.group(4)
+        int2=m.group(5)
+        c3=m.group(6)
+        int3=m.group(7)
+        c4=m.group(8)
+        int4=m.group(9)
+
+        time_progress = int1+c2+int2+c3+int3+c4+int4
+        t = datetime.datetime.strptime(time_progress, '%H:%M:%S.%f')
+        return (t - datetime.datetime(1900, 1, 1)).total_seconds()
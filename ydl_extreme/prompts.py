@@ -0,0 +1,115 @@
+'''Interactive questions asked by the command-line scripts.'''
+
+import re
+import subprocess
+import sys
+
+from .files import check_path
+from .logs import log
+from .timecode import parse_time
+
+
+def clear():
+    '''Clear terminal window'''
+    if sys.platform == 'win32':
+        p = subprocess.Popen('cls', shell=True)
+        p.communicate()
+    else:
+        p = subprocess.Popen(['clear'])
+        p.communicate()
+
+def get_url():
+    "Prompt user to enter YouTube link or local file path"
+    while True:
+        url = input('Enter YouTube link or drag and drop local file: ')
+        path = re.sub('\\\\', '', url).strip()
+        if check_path(path):
+            return path
+        if not url:
+            log.warning('Something went wrong, please ensure you entered a valid URL or file path.')
+        return url
+
+def get_captions():
+    '''Ask user if they would like to burn captions into video after download.'''
+    user_input = input('Burn captions into video? (yes/no): ') or 'n'
+    if not user_input[0].lower() == 'y':
+        return False
+    return True
+
+def get_auto_captions():
+    '''If user wants captions, ask if they want them auto-generated by YouTube.
+
+    This is not available for all videos.
+    '''
+    user_input = input('Auto-generated captions? (yes/no): ') or 'n'
+    if not user_input[0].lower() == 'y':
+        return False
+    return True
+
+def get_trim(preview=None):
+    '''Ask user if they would like to trim the video after download.
+
+    preview, if given, is called to show a thumbnail sheet first when they
+    want one (see preview.py).
+    '''
+    user_input = input('Would you like to trim the video? (yes/no): ') or 'n'
+    if not user_input[0].lower() == 'y':
+        return False, False
+    if preview is not None and get_preview():
+        preview()
+    starttime = get_time('in')
+    runtime = get_time('out')
+    return starttime, runtime
+
+def get_preview():
+    '''Show thumbnails to pick trim points from'''
+    user_input = input('Would you like a thumbnail preview to pick trim points? (yes/no)') or 'n'
+    if not user_input[0].lower() == 'y':
+        return False
+    return True
+
+def get_time(mode):
+    '''Ask for a trim point until it's blank or a time parse_time() can read.'''
+    while True:
+        bs = input('What %s point do you want? (hh:mm:ss, leave blank for default): ' % mode)
+        try:
+            parse_time(bs)
+        except ValueError:
+            log.warning('Could not read "{}" as hh:mm:ss, try again.'.format(bs))
+            continue
+        return bs
+
+def get_norm():
+    '''Normalize audio levels'''
+    user_input = input('Would you like to normalize the audio level? (yes/no)') or 'n'
+    if not user_input[0].lower() == 'y':
+        return False
+    return True
+
+def get_audio():
+    '''Output Audio only'''
+    user_input = input('Would you like to output this as audio only? (yes/no)') or 'n'
+    if not user_input[0].lower() == 'y':
+        return False
+    return True
+
+def get_mp4():
+    '''Convert to MP4 instead of encoding'''
+    user_input = input('Would you like to convert to MP4 format? (yes/no)') or 'n'
+    if not user_input[0].lower() == 'y':
+        return False
+    return True
+
+def get_split_chapters():
+    '''Encode one file per chapter'''
+    user_input = input('Would you like one file per chapter? (yes/no)') or 'n'
+    if not user_input[0].lower() == 'y':
+        return False
+    return True
+
+def get_legacy():
+    '''Use legacy youtube downloader for compatibility'''
+    user_input = input('Would you like to use the legacy version of YT Downloader? (yes/no)') or 'n'
+    if not user_input[0].lower() == 'y':
+        return False
+    return True
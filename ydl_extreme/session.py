@@ -0,0 +1,108 @@
+'''Long-lived YoutubeDL instances for extraction, shared across jobs.
+
+A new YoutubeDL per attempt means new extractor instances, an empty
+cookie jar, the YouTube player JS fetched and its signature functions
+parsed again, and cold connections for every webpage/API request.  Instead
+one instance per backend (yt-dlp, or youtube-dl for legacy jobs) handles
+extraction for every job in the process: the prompt loop, watch mode and
+the prefetch thread alike.
+
+Extraction doesn't depend on per-job options, so the session instance has
+none; downloads still get a YoutubeDL built from the job's options (see
+downloader()), seeded with the session's cookies and the info's HTTP
+headers, and the extracted info is handed over with process_ie_result.
+An instance is recycled after SESSION_JOBS extractions, or as soon as one
+fails.
+
+The lock only guards the pool: an instance is taken out of it for the
+length of an extraction, so a second extraction running at the same time
+(the prefetch thread and a watch mode job, say) gets an instance of its
+own instead of waiting on the network.  Only one goes back afterwards.
+'''
+
+import atexit
+import threading
+
+from .logs import log_file_only
+
+SESSION_JOBS = 25
+# Seconds a read may block before the downloader retries the connection
+# (youtube-dl otherwise waits forever on a hung fragment)
+SOCKET_TIMEOUT = 30
+SESSION_OPTS = {'quiet': True, 'noprogress': True, 'socket_timeout': SOCKET_TIMEOUT}
+
+_sessions = {}
+# Cookie jar of the latest successful extraction per backend
+_cookies = {}
+_lock = threading.Lock()
+_registered = False
+
+
+class Session(object):
+    def __init__(self, backend):
+        self.ydl = backend.YoutubeDL(dict(SESSION_OPTS, logger=log_file_only))
+        self.uses = 0
+
+    def close(self):
+        try:
+            self.ydl.__exit__(None, None, None)
+        except Exception as e:
+            log_file_only.info('Closing downloader session: {}'.format(e))
+
+
+def close_sessions():
+    '''Close every session instance; the next extraction starts a new one.'''
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+def checkout(backend):
+    '''Take the backend's session out of the pool, or start one if it's empty or in use.'''
+    global _registered
+    with _lock:
+        if not _registered:
+            atexit.register(close_sessions)
+            _registered = True
+        session = _sessions.pop(backend.__name__, None)
+    return session or Session(backend)
+
+def checkin(backend, session):
+    '''Put a session back in the pool, or close it if it's used up or another one got there first.'''
+    with _lock:
+        if session.uses < SESSION_JOBS and backend.__name__ not in _sessions:
+            _sessions[backend.__name__] = session
+            return
+    session.close()
+
+def extract_info(backend, url):
+    '''extract_info(url, download=False, process=False) on a pooled instance of the backend.
+
+    Errors propagate after the instance is dropped.
+    '''
+    session = checkout(backend)
+    session.uses += 1
+    try:
+        info = session.ydl.extract_info(url, download=False, process=False)
+    except Exception:
+        log_file_only.info('Recycling {} session after an error'.format(backend.__name__))
+        session.close()
+        raise
+    _cookies[backend.__name__] = session.ydl.cookiejar
+    checkin(backend, session)
+    return info
+
+def downloader(backend, ydl_opts, info=None):
+    '''A YoutubeDL with the job's options for downloading what a session extracted.
+
+    It gets the session's cookies, which some sites require on the media
+    requests, and the info's http_headers.
+    '''
+    if info and info.get('http_headers'):
+        ydl_opts = dict(ydl_opts, http_headers=dict(ydl_opts.get('http_headers') or {}, **info['http_headers']))
+    ydl = backend.YoutubeDL(ydl_opts)
+    jar = _cookies.get(backend.__name__)
+    if jar is not None:
+        for cookie in list(jar):
+            ydl.cookiejar.set_cookie(cookie)
+    return ydl
@@ -0,0 +1,159 @@
+'''Pre-flight disk space checks, so jobs don't die hours in on a full disk.
+
+Output size is estimated from ENCODER_BITRATES (Mb/s at 1920x1080 and
+29.97 fps, scaled by resolution and frame rate) times the trimmed duration.
+A local source also needs room for its copy into the scratch folder, and a
+URL for its download, estimated from the prefetch's extracted info (the
+selected formats' filesize, filesize_approx or bitrate times duration, cut
+down to the trimmed range).  The finished output needs room in the download
+location when that is on a different volume than the scratch folder, and
+with -progressive the fragmented file is written there as well.  Sizes for
+folders on the same volume add up.
+'''
+
+import os
+import re
+import shutil
+
+from .download import KEYFRAME_MARGIN, format_size, select_audio_format, select_format
+from .logs import log, log_file_only
+from .preview import EXTRACT_TIMEOUT
+from .probe import get_duration
+from .timecode import get_trim_range, parse_time
+
+# Approximate video bitrates in Mb/s at 1920x1080, 29.97 fps
+PRORES_BITRATES = {0: 45, 1: 102, 2: 147, 3: 220, 4: 330, 5: 500}
+ENCODER_BITRATES = [('prores', 147), ('dnxhd', 145), ('libx265', 8), ('hevc', 8),
+                    ('libx264', 12), ('h264', 12), ('vp9', 8), ('vp8', 10), ('mpeg4', 10)]
+UNKNOWN_BITRATE = 150
+# 24-bit 48 kHz stereo PCM, and the audio-only outputs
+PCM_BITRATE = 2.3
+AUDIO_BITRATES = {'mp3': 0.25, 'm4a': 0.256, 'opus': 0.16}
+# Estimates are padded by this factor, and this much is always left free
+SPACE_MARGIN = 1.2
+RESERVE_BYTES = 1024 ** 3
+
+PROFILE_RE = re.compile(r'-profile:v\s+(\d+)')
+
+
+def video_bitrate(config):
+    '''Estimated Mb/s of config.encoding at the configured size and frame rate.'''
+    encoding = config.encoding.lower()
+    rate = UNKNOWN_BITRATE
+    if 'prores' in encoding:
+        match = PROFILE_RE.search(encoding)
+        rate = PRORES_BITRATES.get(int(match.group(1)) if match else 2, UNKNOWN_BITRATE)
+    else:
+        for name, bitrate in ENCODER_BITRATES:
+            if name in encoding:
+                rate = bitrate
+                break
+    scale = (config.width * config.height) / (1920.0 * 1080) * config.framerate / 29.97
+    return rate * scale
+
+def clip_length(job, duration):
+    start = parse_time(job.inpoint) or 0
+    end = parse_time(job.outpoint)
+    if end is None or end > duration:
+        end = duration
+    return max(end - start, 0)
+
+def estimate_output_size(job):
+    '''Estimated bytes written by the job's encode, or None if the duration isn't known.'''
+    duration = get_duration(job.metadata) if job.metadata else None
+    if not duration:
+        return None
+    length = clip_length(job, duration)
+    if job.skip_encoding:
+        # Re-wrapped or smart-cut: about the matching share of the source
+        return os.path.getsize(job.files['video']) * length / duration
+    if job.audio:
+        bitrate = AUDIO_BITRATES.get(job.config.audio_format, PCM_BITRATE)
+    else:
+        bitrate = video_bitrate(job.config) + PCM_BITRATE
+    return bitrate * 1000000 / 8 * length
+
+def estimate_download_size(job, info):
+    '''Estimated bytes of a URL job's download from its extracted info, or None.'''
+    if not info or info.get('_type', 'video') != 'video':
+        return None
+    if job.audio:
+        selected = select_audio_format(info, job.config.audio_format, logger=log_file_only)
+    else:
+        selected = select_format(info, job.config.width, job.config.height, logger=log_file_only)
+    if not selected:
+        return None
+    duration = info.get('duration')
+    formats = {f.get('format_id'): f for f in info.get('formats') or []}
+    sizes = [format_size(formats[i], duration) if i in formats else None for i in selected.split('+')]
+    if not all(sizes):
+        return None
+    size = sum(sizes)
+    if duration and get_trim_range(job.inpoint, job.outpoint) and not job.legacy:
+        # Only the trimmed range and its lead-in are downloaded
+        size *= min(clip_length(job, duration) + KEYFRAME_MARGIN, duration) / duration
+    return size
+
+def existing(path):
+    '''path, or its nearest parent that exists (folders are made later).'''
+    path = os.path.abspath(path)
+    while not os.path.exists(path):
+        path = os.path.dirname(path)
+    return path
+
+def free_space(path):
+    return shutil.disk_usage(existing(path)).free
+
+def same_volume(a, b):
+    return os.stat(existing(a)).st_dev == os.stat(existing(b)).st_dev
+
+def merge_volumes(needed):
+    '''Add up the bytes of folders on the same volume, keeping the first folder of each.'''
+    merged = []
+    for folder, size in needed:
+        for i, (other, total) in enumerate(merged):
+            if same_volume(folder, other):
+                merged[i] = (other, total + size)
+                break
+        else:
+            merged.append((folder, size))
+    return merged
+
+def space_needed(job):
+    '''Return [(folder, bytes)] the job still has to write, one folder per volume.
+
+    Before the download that's the copy of a local source, or the estimated
+    download of a URL (nothing if its info isn't extracted); after probe()
+    it's the estimated output, in the scratch folder and (if on another
+    volume, or with -progressive) the download location.
+    '''
+    if job.files.get('video') is None:
+        if job.local:
+            return [(job.downloading, os.path.getsize(job.source))]
+        info = job.prefetch.wait_for_info(EXTRACT_TIMEOUT) if job.prefetch else None
+        size = estimate_download_size(job, info)
+        return [(job.downloading, size)] if size else []
+    size = estimate_output_size(job)
+    if size is None:
+        return []
+    config = job.config
+    work = job.downloading if job.skip_encoding else job.encoding_dir
+    progressive = config.progressive and not (job.audio or job.skip_encoding)
+    needed = [(work, size)]
+    if progressive or not same_volume(work, config.download_location):
+        needed.append((config.download_location, size))
+    return merge_volumes(needed)
+
+def fits(folder, size, logger=log):
+    '''True if folder has room for size bytes, with the margin and reserve.'''
+    need = size * SPACE_MARGIN + RESERVE_BYTES
+    free = free_space(folder)
+    if free < need:
+        logger.warning('Not enough space in {}: about {:.1f} GB needed, {:.1f} GB free'.format(
+            folder, need / 1024 ** 3, free / 1024 ** 3))
+        return False
+    return True
+
+def check_space(job, logger=log):
+    '''True if every folder the job writes to has room for its estimate.'''
+    return all(fits(folder, size, logger) for folder, size in space_needed(job))
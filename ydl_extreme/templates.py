@@ -0,0 +1,204 @@
+'''ffmpeg command templates.
+
+Each template is a list joined with spaces and filled in with str.format at
+encode time ({encoding} and {framerate} come from the Config).
+'''
+
+# Audio-only output formats: extension, source codecs that can be stream-copied,
+# preferred YouTube audio ext, and the transcode settings used otherwise
+AUDIO_OUTPUTS = {'mp3': ('.mp3', ['mp3'], None, 'libmp3lame -qscale:a 2 -ar 48000'),
+                 'm4a': ('.m4a', ['aac', 'mp4a'], 'm4a', 'aac -b:a 256k -ar 48000'),
+                 'opus': ('.opus', ['opus'], 'webm', 'libopus -b:a 160k -ar 48000')}
+
+# Scale to fit {width}x{height} keeping the aspect ratio, then pad to exactly that size
+LETTERBOX_FILTER = (r'scale=(sar*iw)*min({width}/(sar*iw)\,{height}/ih)'
+                    r':ih*min({width}/(sar*iw)\,{height}/ih), '
+                    r'pad={width}:{height}:({width}-(sar*iw)*min'
+                    r'({width}/(sar*iw)\,{height}/ih))/2:({height}-'
+                    r'ih*min({width}/(sar*iw)\,'
+                    r'{height}/ih))/2')
+
+FFMPEG_MP4_CONTAINER = ['ffmpeg', '-ss', '{startpoint}',
+                        '-i', '{inpath}',
+                        '-t', '{length}',
+                        '-c:v', 'mpeg4',
+                        '-c:a', 'aac',
+                        '{outpath}']
+
+# Smart-cut pieces: whole GOPs are stream-copied, boundary GOPs re-encoded,
+# then everything is joined with the concat demuxer and fresh AAC audio
+FFMPEG_SMARTCUT_COPY = ['ffmpeg', '-y', '-ss', '{startpoint}',
+                        '-i', '{inpath}',
+                        '-t', '{length}',
+                        '-an', '-c:v', 'copy',
+                        '-avoid_negative_ts', 'make_zero',
+                        '{outpath}']
+FFMPEG_SMARTCUT_ENCODE = ['ffmpeg', '-y', '-ss', '{startpoint}',
+                          '-i', '{inpath}',
+                          '-t', '{length}',
+                          '-an', '-c:v', '{encoder}',
+                          '{params}',
+                          '{outpath}']
+FFMPEG_SMARTCUT_JOIN = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0',
+                        '-i', '{listpath}',
+                        '-ss', '{startpoint}',
+                        '-i', '{inpath}',
+                        '-t', '{length}',
+                        '-map', '0:v', '-map', '1:a?',
+                        '-c:v', 'copy',
+                        '-c:a', 'aac',
+                        '{outpath}']
+# Encoders able to produce GOPs that splice into a stream-copied source
+SMARTCUT_ENCODERS = {'h264': 'libx264', 'hevc': 'libx265'}
+
+FFMPEG_PRORES = ['ffmpeg', '-ss', '{startpoint}',
+                 '-i', '{inpath}',
+                 '-t', '{length}',
+                 '-c:v', '{encoding}',
+                 '-r', '{framerate}',
+                 '{audio_filter}',
+                 '-c:a', 'pcm_s24le',
+                 '-ar', '48000',
+                 '{output_opts}',
+                 '{outpath}']
+FFMPEG_AUDIO = ['ffmpeg', '-ss', '{startpoint}',
+                 '-i', '{inpath}',
+                 '-t', '{length}',
+                 '-vn',
+                 '{audio_filter}',
+                 '-c:a', '{audio_codec}',
+                 '{outpath}']
+FFMPEG_PRORES_CAPS = ['ffmpeg', '-ss', '{startpoint}',
+                      '-i', '{inpath}',
+                      '-t', '{length}',
+                      '-vf',
+                      "'subtitles={subtitles}'",
+                      '-c:v', '{encoding}',
+                      '-r', '{framerate}',
+                      '{audio_filter}',
+                      '-c:a', 'pcm_s24le',
+                      '-ar', '48000',
+                      '{output_opts}',
+                      '{outpath}']
+FFMPEG_PRORES_LETTERBOX = ['ffmpeg', '-ss', '{startpoint}',
+                           '-i', '{inpath}',
+                           '-t', '{length}',
+                           '-vf',
+                           "'{crop}" + LETTERBOX_FILTER + "'",
+                           '-c:v', '{encoding}',
+                           '-r', '{framerate}',
+                           '{audio_filter}',
+                           '-c:a pcm_s24le',
+                           '-ar 48000',
+                           '{output_opts}',
+                           '{outpath}']
+FFMPEG_PRORES_LETTERBOX_CAPS = ['ffmpeg', '-ss', '{startpoint}',
+                                '-i', '{inpath}',
+                                '-t', '{length}',
+                                '-vf',
+                                ("'{crop}" + LETTERBOX_FILTER +
+                                 ",subtitles={subtitles}'"),
+                                '-c:v', '{encoding}',
+                                '-r', '{framerate}',
+                                '{audio_filter}',
+                                '-c:a pcm_s24le',
+                                '-ar 48000',
+                                '{output_opts}',
+                                '{outpath}']
+
+# Distributed encoding: stream-copy the GOPs a worker needs (upload mode),
+# then join the workers' pieces and encode the audio over the whole range
+FFMPEG_SEGMENT_SPLIT = ['ffmpeg', '-y', '-ss', '{startpoint}',
+                        '-i', '{inpath}',
+                        '-t', '{length}',
+                        '-map', '0:v:0', '-c', 'copy',
+                        '-avoid_negative_ts', 'make_zero',
+                        '{outpath}']
+FFMPEG_DISTRIBUTED_JOIN = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0',
+                           '-i', '{listpath}',
+                           '-ss', '{startpoint}',
+                           '-i', '{inpath}',
+                           '-t', '{length}',
+                           '-map', '0:v', '-map', '1:a?',
+                           '-c:v', 'copy',
+                           '{audio_filter}',
+                           '-c:a', 'pcm_s24le',
+                           '-ar', '48000',
+                           '{outpath}']
+
+# One-off conversion of a downloaded caption track, see captions.py
+FFMPEG_CAPTIONS_ASS = ['ffmpeg', '-y', '-i', '{inpath}', '{outpath}']
+
+# Muxer options for -progressive: a fragmented MOV/MP4 plays while it's still
+# being written; fragments start on keyframes but last at least 2 seconds
+# (ProRes is all keyframes), and FFMPEG_FASTSTART remuxes it afterwards
+FRAGMENTED_OUTPUT = '-movflags frag_keyframe+empty_moov -min_frag_duration 2000000'
+# Only audio and video are mapped: the chapter text track of the fragmented
+# file can't be stream-copied, the muxer writes the chapters again itself
+FFMPEG_FASTSTART = ['ffmpeg', '-y', '-i', '{inpath}',
+                    '-map', '0:v', '-map', '0:a?', '-c', 'copy',
+                    '-movflags', '+faststart',
+                    '{outpath}']
+
+# Synthetic clip for timing encoder settings, see calibrate.py
+FFMPEG_CALIBRATE = ['ffmpeg', '-y', '-f', 'lavfi',
+                    '-i', 'testsrc2=size={width}x{height}:rate={framerate}',
+                    '-t', '{length}',
+                    '-c:v', '{encoding}',
+                    '{outpath}']
+
+# Short sampled windows decoded by analyze.py: per-channel levels, loudness
+# and black bars, without touching the rest of the file
+FFMPEG_ANALYZE = ['ffmpeg', '-nostats', '-hide_banner',
+                  '-ss', '{startpoint}',
+                  '-i', '{inpath}',
+                  '-t', '{length}',
+                  '{audio_filter}',
+                  '{video_filter}',
+                  '-f', 'null', '-']
+
+FFMPEG_NORM =   [' && ffmpeg-normalize',
+                '{outpath}',
+                '-o',
+                '{outpath}',
+                '-f']
+
+# Synthetic media served by the offline download benchmark (benchmark.py):
+# a progressive mp4, then the same streams repackaged as HLS and DASH
+FFMPEG_BENCH_SOURCE = ['ffmpeg', '-y', '-f', 'lavfi',
+                       '-i', 'testsrc2=size={width}x{height}:rate=30',
+                       '-f', 'lavfi',
+                       '-i', 'sine=frequency=440:sample_rate=48000',
+                       '-t', '{length}',
+                       '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '60',
+                       '-c:a', 'aac', '-movflags', '+faststart',
+                       '{outpath}']
+FFMPEG_BENCH_HLS = ['ffmpeg', '-y', '-i', '{inpath}',
+                    '-c', 'copy', '-f', 'hls',
+                    '-hls_time', '2', '-hls_playlist_type', 'vod',
+                    '-hls_segment_filename', '{outdir}/segment%04d.ts',
+                    '-master_pl_name', 'master.m3u8',
+                    '{outdir}/index.m3u8']
+FFMPEG_BENCH_DASH = ['ffmpeg', '-y', '-i', '{inpath}',
+                     '-map', '0:v', '-map', '0:a',
+                     '-c', 'copy', '-f', 'dash',
+                     '-seg_duration', '2', '-use_template', '1', '-use_timeline', '0',
+                     '-adaptation_sets', 'id=0,streams=v id=1,streams=a',
+                     '{outdir}/manifest.mpd']
+
+# One keyframe per thumbnail for preview.py: seek on the input side and decode
+# only keyframes, so each grab costs one frame however long the source is
+FFMPEG_THUMBNAIL = ['ffmpeg', '-y', '-v', 'error',
+                    '-skip_frame', 'nokey',
+                    '{headers}',
+                    '-ss', '{startpoint}',
+                    '-i', '{inpath}',
+                    '-map', '0:v:0', '-frames:v', '1',
+                    '-vf', 'scale={width}:-2',
+                    '-q:v', '4',
+                    '{outpath}']
+FFMPEG_CONTACT_SHEET = ['ffmpeg', '-y', '-v', 'error',
+                        '-i', '{inpattern}',
+                        '-vf', 'tile={columns}x{rows}:padding=4:margin=4',
+                        '-frames:v', '1', '-q:v', '3',
+                        '{outpath}']
@@ -0,0 +1,37 @@
+'''Helpers for hh:mm:ss trim points.'''
+
+from .logs import log
+
+
+def parse_time(value):
+    '''Convert hh:mm:ss[.ms] (or mm:ss, or seconds) to seconds.  Blank returns None.'''
+    if not value:
+        return None
+    seconds = 0.0
+    for part in value.strip().split(':'):
+        seconds = seconds * 60 + float(part or 0)
+    return seconds
+
+def format_time(seconds):
+    '''Convert seconds to hh:mm:ss.mmm for ffmpeg.'''
+    seconds = max(seconds, 0)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    return '{:02d}:{:02d}:{:06.3f}'.format(int(hours), int(minutes), seconds)
+
+def get_trim_range(inpoint, outpoint):
+    '''Return (start, end) seconds for the trim prompts, or None if not trimming.'''
+    try:
+        start, end = parse_time(inpoint), parse_time(outpoint)
+    except ValueError:
+        log.warning('Could not parse trim points, downloading the whole video.')
+        return None
+    if start is None and end is None:
+        return None
+    return (start or 0, end)
+
+def rebase_time(value, offset):
+    '''Shift a trim point onto a partial download starting at offset seconds.'''
+    if not value or not offset:
+        return value
+    return format_time(parse_time(value) - offset)
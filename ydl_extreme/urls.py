@@ -0,0 +1,82 @@
+'''Canonical video IDs for URLs: the key for jobs, the ledger and caches.
+
+The same YouTube video turns up as watch?v= links with any number of extra
+parameters (si=, pp=, t=, list=...), youtu.be short links, /shorts/,
+/embed/ and /live/ paths, and m./music./nocookie hosts.  canonical_id()
+maps all of them to ('youtube', ID) with urllib.parse alone.  Other URLs
+fall back to the first yt-dlp extractor whose suitable() accepts them, and
+its _match_id(), which is still a regex match without network access.
+Only extractors that return a single video count: playlist, channel and
+tab URLs, and YouTube's truncated-ID catcher, have no video ID.  Neither
+do URLs nothing recognizes.
+
+tests/test_urls.py checks the canonicalizer against a corpus of URL forms.
+'''
+
+import functools
+import re
+from urllib.parse import parse_qs, urlsplit
+
+YOUTUBE_HOSTS = {'youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com',
+                 'youtube-nocookie.com', 'www.youtube-nocookie.com'}
+SHORT_HOSTS = {'youtu.be', 'www.youtu.be'}
+# Path prefixes followed by the video ID
+YOUTUBE_PATHS = ['shorts', 'embed', 'v', 'e', 'live']
+VIDEO_ID_RE = re.compile(r'^[0-9A-Za-z_-]{11}$')
+
+
+def youtube_id(url):
+    '''The video ID of any YouTube video URL form, or None.'''
+    parts = urlsplit(url if '://' in url else 'https://' + url)
+    host = (parts.hostname or '').lower()
+    segments = [s for s in parts.path.split('/') if s]
+    candidate = None
+    if host in SHORT_HOSTS:
+        candidate = segments[0] if segments else None
+    elif host in YOUTUBE_HOSTS:
+        if segments[:1] == ['watch']:
+            candidate = (parse_qs(parts.query).get('v') or [None])[0]
+        elif len(segments) >= 2 and segments[0] in YOUTUBE_PATHS:
+            candidate = segments[1]
+    return candidate if candidate and VIDEO_ID_RE.match(candidate) else None
+
+def extractor_id(url):
+    '''(extractor, id) from the first yt-dlp extractor that accepts url, if it's a video one.'''
+    try:
+        from yt_dlp.extractor import gen_extractor_classes
+    except ImportError:
+        return None
+    for ie in gen_extractor_classes():
+        if ie.ie_key() == 'Generic' or not ie.suitable(url):
+            continue
+        if getattr(ie, '_RETURN_TYPE', None) != 'video':
+            return None
+        try:
+            video_id = ie._match_id(url)
+        except (AssertionError, IndexError, KeyError, TypeError):
+            return None
+        return (ie.ie_key().lower(), str(video_id)) if video_id else None
+    return None
+
+@functools.lru_cache(maxsize=1024)
+def canonical_id(url):
+    '''(extractor, video_id) for a URL, without network access; None if unrecognized.'''
+    url = url.strip()
+    video_id = youtube_id(url)
+    if video_id:
+        return ('youtube', video_id)
+    if urlsplit(url).scheme not in ('http', 'https'):
+        return None
+    return extractor_id(url)
+
+def video_key(url):
+    '''The extractor:id string for a URL, as stored on jobs and in the ledger; None if unrecognized.'''
+    ids = canonical_id(url)
+    return '{}:{}'.format(*ids) if ids else None
+
+def canonical_url(url):
+    '''The plain watch URL for YouTube videos; other URLs are only stripped of whitespace.'''
+    ids = canonical_id(url)
+    if ids and ids[0] == 'youtube':
+        return 'https://www.youtube.com/watch?v={}'.format(ids[1])
+    return url.strip()
@@ -0,0 +1,187 @@
+'''Watch-folder mode: encode every media file dropped into a folder.
+
+New files are only picked up once their size and mtime have stayed the same
+for STABLE_SECONDS, so copies still in progress are left alone.  On Linux
+the folder is watched with inotify (through ctypes, no extra packages);
+elsewhere, or if inotify isn't available, it is polled every POLL_SECONDS.
+
+Arrivals are copied and probed on a small pool, then encoded on a pool of
+config.watch_jobs, each job in its own working folders.  Jobs use the
+Config settings and the Job defaults (no trim, captions or normalization).
+Already processed files are skipped through the fingerprint index, and a
+job waits (rather than fails) while there isn't disk space for it.
+'''
+
+import os
+import select
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .download import download
+from .encode import encode
+from .files import YOUTUBE_AUDIO_FORMATS, YOUTUBE_VIDEO_FORMATS, cleanup, finalize
+from .job import Job
+from .logs import log, log_file_only
+from .probe import probe
+from .space import check_space
+
+STABLE_SECONDS = 5
+POLL_SECONDS = 2
+PROBE_WORKERS = 4
+SPACE_RETRY_SECONDS = 60
+WATCH_FORMATS = YOUTUBE_VIDEO_FORMATS | YOUTUBE_AUDIO_FORMATS | set(['.mov', '.mxf', '.avi', '.m4v', '.ts'])
+# inotify events that can mean a file appeared or grew
+IN_MODIFY, IN_CLOSE_WRITE, IN_MOVED_TO, IN_CREATE = 0x2, 0x8, 0x80, 0x100
+
+
+class FolderEvents(object):
+    '''Sleep until something changes in a folder, or at most a timeout.
+
+    Uses inotify when it's available; otherwise wait() is just a sleep.
+    '''
+
+    def __init__(self, folder):
+        self.fd = None
+        try:
+            import ctypes
+            import ctypes.util
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK)
+            if fd < 0:
+                return
+            mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+            if libc.inotify_add_watch(fd, os.fsencode(folder), mask) < 0:
+                os.close(fd)
+                return
+            self.fd = fd
+        except (OSError, AttributeError, TypeError):
+            pass
+
+    @property
+    def inotify(self):
+        return self.fd is not None
+
+    def wait(self, timeout):
+        if self.fd is None:
+            time.sleep(timeout)
+            return
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if readable:
+            try:
+                while os.read(self.fd, 65536):
+                    pass
+            except BlockingIOError:
+                pass
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def scan(folder):
+    '''Return {path: (size, mtime)} for media files directly in folder.'''
+    found = {}
+    for entry in os.scandir(folder):
+        if entry.name.startswith('.') or not entry.is_file():
+            continue
+        if os.path.splitext(entry.name)[1].lower() not in WATCH_FORMATS:
+            continue
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        found[entry.path] = (stat.st_size, stat.st_mtime)
+    return found
+
+def job_dirs(config, number):
+    base = os.path.join(config.scratch, '.watch', str(number))
+    return os.path.join(base, 'downloading/'), os.path.join(base, 'encoding/')
+
+def wait_for_space(job):
+    '''Hold a job back until its folders have room (see space.py).'''
+    logger = log
+    while not check_space(job, logger=logger):
+        if logger is log:
+            log.info('Queued until there is space: {}'.format(job.source))
+        logger = log_file_only
+        time.sleep(SPACE_RETRY_SECONDS)
+
+def remove_job_dirs(job):
+    cleanup(job)
+    try:
+        os.rmdir(os.path.dirname(os.path.dirname(job.downloading)))
+    except OSError:
+        pass
+
+def ingest(job):
+    '''Copy and probe an arrival; returns the job, or None if there's nothing to encode.'''
+    try:
+        wait_for_space(job)
+        download(job)
+        if job.duplicate or not job.files.get('video'):
+            remove_job_dirs(job)
+            return None
+        probe(job)
+        wait_for_space(job)
+    except Exception:
+        remove_job_dirs(job)
+        raise
+    return job
+
+def process(job):
+    try:
+        if encode(job):
+            finalize(job, True)
+        else:
+            log.warning('Encode failed: {}'.format(job.source))
+    except Exception:
+        log.exception('Failed: {}'.format(job.source))
+    finally:
+        remove_job_dirs(job)
+
+def watch(config, folder=None):
+    '''Process files arriving in folder (config.watch_dir) until interrupted.'''
+    folder = folder or config.watch_dir
+    events = FolderEvents(folder)
+    log.info('Watching {} ({}), {} encode(s) at a time'.format(
+        folder, 'inotify' if events.inotify else 'polling', config.watch_jobs))
+    pending = {}
+    done = set()
+    number = 0
+    probers = ThreadPoolExecutor(max_workers=PROBE_WORKERS)
+    encoders = ThreadPoolExecutor(max_workers=config.watch_jobs)
+
+    def ingested(future):
+        try:
+            job = future.result()
+        except Exception:
+            log.exception('Could not read new file')
+            return
+        if job is not None:
+            encoders.submit(process, job)
+
+    try:
+        while True:
+            now = time.time()
+            for path, state in scan(folder).items():
+                if (path, state) in done:
+                    continue
+                seen = pending.get(path)
+                if seen is None or seen[0] != state:
+                    pending[path] = (state, now)
+                elif now - seen[1] >= STABLE_SECONDS:
+                    del pending[path]
+                    done.add((path, state))
+                    number += 1
+                    downloading, encoding_dir = job_dirs(config, number)
+                    job = Job(path, config, downloading=downloading, encoding_dir=encoding_dir)
+                    log.info('New file: {}'.format(path))
+                    probers.submit(ingest, job).add_done_callback(ingested)
+            events.wait(POLL_SECONDS)
+    except KeyboardInterrupt:
+        log.info('Stopping watch, waiting for running jobs')
+    finally:
+        events.close()
+        probers.shutdown(wait=True)
+        encoders.shutdown(wait=True)